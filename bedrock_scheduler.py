@@ -0,0 +1,236 @@
+# Shared admission control for Bedrock calls (text answers, vision analysis, Whisper).
+# Client-side token buckets sized to the account's RPM/TPM quotas, priority classes so
+# interactive requests are admitted before background jobs, and jittered exponential
+# backoff when Bedrock still throttles.
+# The buckets live in server.py. screenshot_upload.py sets BEDROCK_ADMIT_URL so its background
+# calls are admitted by the server's scheduler (POST /scheduler/admit) and queue behind /ask;
+# if the server is unreachable the helper falls back to its own local buckets.
+
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Callable, Dict
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+# Account quota, enforced by the server's scheduler (the helper's local buckets are only a fallback)
+BEDROCK_RPM = float(os.getenv("BEDROCK_RPM", "50"))
+BEDROCK_TPM = float(os.getenv("BEDROCK_TPM", "200000"))
+BEDROCK_MAX_RETRIES = int(os.getenv("BEDROCK_MAX_RETRIES", "5"))
+BEDROCK_BACKOFF_BASE = float(os.getenv("BEDROCK_BACKOFF_BASE", "0.5"))  # seconds
+BEDROCK_BACKOFF_MAX = float(os.getenv("BEDROCK_BACKOFF_MAX", "20"))     # seconds
+# Longest a remote admission request is held by the server before it answers 503
+BEDROCK_REMOTE_ADMIT_MAX = float(os.getenv("BEDROCK_REMOTE_ADMIT_MAX", "120"))  # seconds
+BEDROCK_REMOTE_RETRY = 30.0 # Seconds to use local buckets after the admitting server was unreachable
+
+THROTTLE_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+}
+
+
+class SchedulerTimeout(Exception):
+    """Raised when a call could not be admitted within its timeout."""
+
+
+def is_throttle(exc: Exception) -> bool:
+    """True for botocore ClientErrors that mean "slow down" (no botocore import needed)."""
+    response = getattr(exc, "response", None) or {}
+    return response.get("Error", {}).get("Code") in THROTTLE_CODES
+
+
+class TokenBucket:
+    """Classic token bucket: `capacity` tokens, refilled continuously at `per_minute`."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = max(1.0, per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def wait_time(self, n: float) -> float:
+        """Seconds until `n` tokens are available (0 if available now)."""
+        return max(0.0, (n - self.tokens) / self.rate)
+
+
+class BedrockScheduler:
+    def __init__(self, rpm: float = BEDROCK_RPM, tpm: float = BEDROCK_TPM,
+                 max_retries: int = BEDROCK_MAX_RETRIES, backoff_base: float = BEDROCK_BACKOFF_BASE,
+                 backoff_max: float = BEDROCK_BACKOFF_MAX, admit_url: str = ""):
+        self.admit_url = admit_url
+        self._remote_down_until = 0.0
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._cond = threading.Condition()
+        self._queue: list = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._stats: Dict[str, Any] = {
+            "admitted": 0, "throttles": 0, "retries": 0, "gave_up": 0, "timeouts": 0,
+            "max_queue_depth": 0, "wait_s_total": 0.0, "remote_admitted": 0, "remote_fallbacks": 0,
+        }
+
+    def _post_remote(self, payload: Dict[str, Any], timeout: float):
+        req = urllib.request.Request(self.admit_url, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+
+    def _admit_remote(self, priority: int, est_tokens: float, timeout: float | None) -> bool:
+        """Ask the server's scheduler to admit this call; False means use the local buckets instead."""
+        if not self.admit_url or time.monotonic() < self._remote_down_until:
+            return False
+        wait = BEDROCK_REMOTE_ADMIT_MAX if timeout is None else min(timeout, BEDROCK_REMOTE_ADMIT_MAX)
+        try:
+            self._post_remote({"priority": priority, "est_tokens": est_tokens, "timeout": wait}, wait + 10)
+        except urllib.error.HTTPError as e:
+            if e.code == 503:
+                with self._cond:
+                    self._stats["timeouts"] += 1
+                raise SchedulerTimeout(f"Bedrock call not admitted by {self.admit_url} within {wait:.1f}s")
+            print(f"[WARN] Remote admission failed (HTTP {e.code}); using local buckets.")
+        except (urllib.error.URLError, OSError) as e:
+            print(f"[WARN] Remote admission unavailable ({e}); using local buckets for {BEDROCK_REMOTE_RETRY:.0f}s.")
+        else:
+            with self._cond:
+                self._stats["remote_admitted"] += 1
+            return True
+        with self._cond:
+            self._stats["remote_fallbacks"] += 1
+        self._remote_down_until = time.monotonic() + BEDROCK_REMOTE_RETRY
+        return False
+
+    def admit(self, priority: int = PRIORITY_BACKGROUND, est_tokens: float = 1000, timeout: float | None = None):
+        """Block until a call may start (raises SchedulerTimeout)."""
+        if not self._admit_remote(priority, est_tokens, timeout):
+            self._admit(priority, est_tokens, timeout)
+
+    def note_throttle(self):
+        """Bedrock throttled a call: drain the request bucket so queued calls wait too."""
+        with self._cond:
+            self._stats["throttles"] += 1
+            self.requests.tokens = min(self.requests.tokens, 0.0)
+
+    def _report_throttle(self):
+        if not self.admit_url or time.monotonic() < self._remote_down_until:
+            return
+        try:
+            self._post_remote({"throttled": True}, 5)
+        except Exception as e:
+            print(f"[WARN] Could not report throttle to {self.admit_url}: {e}")
+
+    def _admit(self, priority: int, est_tokens: float, timeout: float | None):
+        est_tokens = min(est_tokens, self.tokens.capacity)  # Oversized calls still get through
+        entry = (priority, next(self._seq))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        t0 = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], len(self._queue))
+            while True:
+                now = time.monotonic()
+                if self._queue[0] == entry:
+                    self.requests.refill(now)
+                    self.tokens.refill(now)
+                    wait = max(self.requests.wait_time(1), self.tokens.wait_time(est_tokens))
+                    if wait <= 0:
+                        heapq.heappop(self._queue)
+                        self.requests.tokens -= 1
+                        self.tokens.tokens -= est_tokens
+                        self._stats["admitted"] += 1
+                        self._stats["wait_s_total"] += now - t0
+                        self._cond.notify_all()
+                        return
+                else:
+                    wait = None  # Woken when the head is admitted or a higher priority arrives
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._queue.remove(entry)
+                        heapq.heapify(self._queue)
+                        self._stats["timeouts"] += 1
+                        self._cond.notify_all()
+                        raise SchedulerTimeout(f"Bedrock call not admitted within {timeout:.1f}s")
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def call(self, fn: Callable[[], Any], priority: int = PRIORITY_BACKGROUND, est_tokens: float = 1000,
+             timeout: float | None = None, name: str = "bedrock") -> Any:
+        """Run fn() once admitted; retry throttling errors with jittered backoff."""
+        for attempt in range(self.max_retries + 1):
+            self.admit(priority, est_tokens, timeout)
+            try:
+                return fn()
+            except Exception as e:
+                if not is_throttle(e):
+                    raise
+                # Assume the bucket is fuller than it really is; drain it so queued calls wait too
+                self.note_throttle()
+                self._report_throttle()
+                with self._cond:
+                    if attempt == self.max_retries:
+                        self._stats["gave_up"] += 1
+                        raise
+                    self._stats["retries"] += 1
+                delay = self.backoff(attempt)
+                print(f"[WARN] {name} throttled ({type(e).__name__}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            by_priority = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._queue:
+                name = PRIORITY_NAMES.get(priority, str(priority))
+                by_priority[name] = by_priority.get(name, 0) + 1
+            return {
+                "queue_depth": len(self._queue),
+                "queue_depth_by_priority": by_priority,
+                "rpm": self.requests.capacity,
+                "tpm": self.tokens.capacity,
+                "admit_url": self.admit_url or None,
+                **self._stats,
+                "wait_s_total": round(self._stats["wait_s_total"], 3),
+            }
+
+
+_SCHEDULER: BedrockScheduler | None = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def get_scheduler() -> BedrockScheduler:
+    """Process-wide scheduler shared by every Bedrock caller."""
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            _SCHEDULER = BedrockScheduler(admit_url=os.getenv("BEDROCK_ADMIT_URL", ""))
+        return _SCHEDULER
+
+def set_admit_url(url: str):
+    """Have this process's calls admitted by the scheduler behind `url` (empty = local buckets only)."""
+    get_scheduler().admit_url = url
+
+
+def sdk_retry_config():
+    """botocore Config that leaves retries to the scheduler (avoids double backoff)."""
+    from botocore.config import Config
+    return Config(retries={"mode": "standard", "max_attempts": int(os.getenv("BEDROCK_SDK_MAX_ATTEMPTS", "1"))})
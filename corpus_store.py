@@ -0,0 +1,161 @@
+# Memory-compact storage for indexed chunks.
+# File keys and prefixes are interned into tables, per-chunk metadata lives in typed NumPy
+# arrays, and chunk text sits in contiguous UTF-8 buffers addressed by (start, end) offsets.
+# With compression enabled the text is cut into blocks of `block_size` chunks and each sealed
+# block is zstd-compressed; only the blocks holding requested chunks are ever decoded.
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError: # Optional dependency, only needed for compression="zstd"
+    zstandard = None
+
+SOURCE_TYPES = ["other", "screenshot", "transcript"] # Codes stored in the "source" column
+
+_COLUMNS = {
+    "file_id": np.int32,
+    "chunk_id": np.int32,
+    "start": np.int64,        # Byte offset of the chunk within its text block
+    "end": np.int64,
+    "prefix": np.int32,       # Id into CorpusStore.prefixes
+    "source": np.int8,        # Index into SOURCE_TYPES
+    "ts": np.float64,         # Capture time parsed from the key (NaN if unknown)
+    "last_modified": np.float64,
+}
+
+
+class CorpusStore:
+    def __init__(self, compression: Optional[str] = None, block_size: int = 256, cache_blocks: int = 32):
+        if compression == "zstd" and zstandard is None:
+            print("[WARN] zstandard is not installed; storing corpus text uncompressed.")
+            compression = None
+        self.compression = compression
+        self.block_size = block_size if compression else 0
+        self.files: List[str] = []
+        self._file_ids: Dict[str, int] = {}
+        self.prefixes: List[str] = []
+        self._prefix_ids: Dict[str, int] = {}
+        self._n = 0
+        self._cols = {name: np.empty(1024, dtype=dtype) for name, dtype in _COLUMNS.items()}
+        self._sealed: List[bytes] = []  # Compressed blocks (compression only)
+        self._open = bytearray()        # Uncompressed tail block (or the whole text without compression)
+        self._cache: "OrderedDict[int, bytes]" = OrderedDict()
+        self._cache_blocks = cache_blocks
+        self._lock = threading.Lock()
+        if compression:
+            self._compressor = zstandard.ZstdCompressor(level=3) # Only used under _lock
+            self._local = threading.local() # zstd (de)compressor objects are not thread-safe
+
+    def __len__(self) -> int:
+        return self._n
+
+    @staticmethod
+    def _intern(table: List[str], ids: Dict[str, int], value: str) -> int:
+        idx = ids.get(value)
+        if idx is None:
+            idx = ids[value] = len(table)
+            table.append(value)
+        return idx
+
+    def file_id(self, key: str) -> Optional[int]:
+        return self._file_ids.get(key)
+
+    def prefix_id(self, prefix: str) -> Optional[int]:
+        return self._prefix_ids.get(prefix)
+
+    def _grow(self, needed: int):
+        cap = len(self._cols["file_id"])
+        if needed <= cap:
+            return
+        while cap < needed:
+            cap *= 2
+        for name, arr in self._cols.items():
+            grown = np.empty(cap, dtype=arr.dtype)
+            grown[:self._n] = arr[:self._n]
+            self._cols[name] = grown
+
+    def extend(self, texts: Iterable[str], meta: Iterable[Dict[str, Any]]):
+        """Append chunks; meta rows carry file, chunk_id, prefix, source, ts and last_modified."""
+        texts, meta = list(texts), list(meta)
+        with self._lock:
+            self._grow(self._n + len(texts))
+            cols = self._cols
+            for text, m in zip(texts, meta):
+                row = self._n
+                data = text.encode("utf-8")
+                cols["start"][row] = len(self._open)
+                self._open += data
+                cols["end"][row] = len(self._open)
+                cols["file_id"][row] = self._intern(self.files, self._file_ids, m["file"])
+                cols["chunk_id"][row] = m["chunk_id"]
+                cols["prefix"][row] = self._intern(self.prefixes, self._prefix_ids, m["prefix"])
+                cols["source"][row] = SOURCE_TYPES.index(m["source"])
+                cols["ts"][row] = np.nan if m["ts"] is None else m["ts"]
+                cols["last_modified"][row] = m["last_modified"]
+                self._n += 1
+                if self.block_size and self._n % self.block_size == 0:
+                    self._sealed.append(self._compressor.compress(bytes(self._open)))
+                    self._open = bytearray()
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Row-aligned views of the metadata columns (safe to read while appends continue)."""
+        n = self._n
+        return {name: arr[:n] for name, arr in self._cols.items()}
+
+    def _block(self, block_id: int) -> bytes:
+        with self._lock:
+            data = self._cache.get(block_id)
+            if data is not None:
+                self._cache.move_to_end(block_id)
+                return data
+        decompressor = getattr(self._local, "decompressor", None)
+        if decompressor is None:
+            decompressor = self._local.decompressor = zstandard.ZstdDecompressor()
+        data = decompressor.decompress(self._sealed[block_id])
+        with self._lock:
+            self._cache[block_id] = data
+            while len(self._cache) > self._cache_blocks:
+                self._cache.popitem(last=False)
+        return data
+
+    def text(self, row: int) -> str:
+        start, end = int(self._cols["start"][row]), int(self._cols["end"][row])
+        block_id = row // self.block_size if self.block_size else 0
+        with self._lock:
+            if not self.block_size or block_id >= len(self._sealed): # Still in the open buffer
+                return self._open[start:end].decode("utf-8")
+        return self._block(block_id)[start:end].decode("utf-8")
+
+    def texts(self, rows: Iterable[int]) -> List[str]:
+        return [self.text(int(r)) for r in rows]
+
+    def file(self, row: int) -> str:
+        return self.files[int(self._cols["file_id"][row])]
+
+    def chunk_id(self, row: int) -> int:
+        return int(self._cols["chunk_id"][row])
+
+    def nbytes(self) -> Dict[str, int]:
+        """Approximate memory footprint (arrays at capacity, text buffers, interned strings)."""
+        return {
+            "columns": int(sum(arr.nbytes for arr in self._cols.values())),
+            "text": len(self._open) + sum(len(b) for b in self._sealed),
+            "tables": sum(len(f) for f in self.files) + sum(len(p) for p in self.prefixes),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = self.nbytes()
+        total = sum(sizes.values())
+        return {
+            "chunks": self._n,
+            "files": len(self.files),
+            "compression": self.compression or "none",
+            "bytes": total,
+            "bytes_by_part": sizes,
+            "bytes_per_chunk": round(total / self._n, 1) if self._n else 0.0,
+        }
@@ -0,0 +1,195 @@
+# Offline retrieval evaluation: runs server.build_corpus/build_index + search over a grid of
+# index configurations against a labeled question set, using only local .txt files (no S3,
+# no Bedrock), and reports recall@k, MRR, index size, build time and query latency.
+#
+# Labels are JSONL, one question per line. "relevant" lists file keys (any chunk of the file
+# counts) and/or {"file": ..., "chunk_id": ...} objects (only valid for one chunking):
+#   {"question": "What error did the login page show?", "relevant": ["screenshots/analysis_20251102_101500.txt"]}
+#
+# Example:
+#   python eval_retrieval.py --docs ./corpus --labels labels.jsonl \
+#       --chunk-sizes 400,800 --overlaps 100,200 --ngrams 3-5,2-4 --vectorizers tfidf,hashing --top-k 1,5,10
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import time
+from typing import Any, Dict, List, Tuple
+
+import server
+
+
+def load_docs(root: str) -> List[Tuple[str, str, float]]:
+    """Read every .txt under root as (key, text, mtime); keys are paths relative to root with '/'."""
+    docs = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in sorted(filenames):
+            if not name.endswith(".txt"):
+                continue
+            path = os.path.join(dirpath, name)
+            key = os.path.relpath(path, root).replace(os.sep, "/")
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                text = f.read()
+            if text.strip():
+                docs.append((key, text, os.path.getmtime(path)))
+    return docs
+
+
+def load_labels(path: str) -> List[Dict[str, Any]]:
+    labels = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            files, chunks = set(), set()
+            for rel in item.get("relevant", []):
+                if isinstance(rel, str):
+                    files.add(rel)
+                else:
+                    chunks.add((rel["file"], int(rel["chunk_id"])))
+            labels.append({"question": item["question"], "files": files, "chunks": chunks})
+    return labels
+
+
+def _is_relevant(label: Dict[str, Any], file: str, chunk_id: int) -> bool:
+    return file in label["files"] or (file, chunk_id) in label["chunks"]
+
+
+def _relevant_found(label: Dict[str, Any], hits: List[Tuple[str, int]]) -> int:
+    """Distinct relevant items covered by hits (a relevant file counts once)."""
+    found = set()
+    for file, chunk_id in hits:
+        if file in label["files"]:
+            found.add(file)
+        elif (file, chunk_id) in label["chunks"]:
+            found.add((file, chunk_id))
+    return len(found)
+
+
+def configure(config: Dict[str, Any]):
+    """Point the server's module-level index settings at one grid configuration."""
+    server.CHUNK_SIZE = config["chunk_size"]
+    server.CHUNK_OVERLAP = config["overlap"]
+    server.INDEX_NGRAM_RANGE = config["ngram_range"]
+    server.INDEX_VECTORIZER = config["vectorizer"]
+    server.INDEX_DTYPE = config["dtype"]
+    server.INDEX_MIN_DF = config["min_df"]
+    server.INDEX_SHARDS = config["shards"]
+    server.INDEX_SHARD_RETENTION_DAYS = 0
+    # Measure real query cost, not cache hits
+    server.SEARCH_CACHE = server.LRUCache(0)
+    server.QUERY_VECTOR_CACHE = server.LRUCache(0)
+
+
+def evaluate(config: Dict[str, Any], docs, labels, top_ks: List[int]) -> Dict[str, Any]:
+    configure(config)
+    t0 = time.perf_counter()
+    server.build_index(docs)
+    build_s = time.perf_counter() - t0
+
+    store = server.STORE
+    # All shards share one vectorizer, so its bytes are counted once
+    index_bytes = store.stats()["bytes"] + sum(sh.footprint.get("matrix_bytes", 0) for sh in server.SHARDS) + (
+        server.SHARDS[0].footprint.get("vectorizer_bytes", 0) if server.SHARDS else 0)
+
+    max_k = max(top_ks)
+    recalls = {k: [] for k in top_ks}
+    reciprocal_ranks, latencies = [], []
+    for label in labels:
+        t1 = time.perf_counter()
+        results = server.search(label["question"], top_k=max_k)
+        latencies.append(time.perf_counter() - t1)
+        hits = [(store.file(idx), store.chunk_id(idx)) for _, idx in results]
+        total = len(label["files"]) + len(label["chunks"])
+        for k in top_ks:
+            recalls[k].append(_relevant_found(label, hits[:k]) / total if total else 0.0)
+        rank = next((i + 1 for i, (f, c) in enumerate(hits) if _is_relevant(label, f, c)), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+
+    latencies_ms = sorted(l * 1000 for l in latencies)
+    return {
+        **{f"recall@{k}": round(statistics.mean(recalls[k]), 4) for k in top_ks},
+        "mrr": round(statistics.mean(reciprocal_ranks), 4),
+        "chunks": len(store),
+        "index_mb": round(index_bytes / 1e6, 2),
+        "build_s": round(build_s, 3),
+        "p50_ms": round(statistics.median(latencies_ms), 2),
+        "p95_ms": round(latencies_ms[min(len(latencies_ms) - 1, int(0.95 * len(latencies_ms)))], 2),
+    }
+
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def _ngrams(value: str) -> List[Tuple[int, int]]:
+    return [tuple(int(x) for x in v.split("-")) for v in value.split(",") if v]
+
+
+def _min_dfs(value: str) -> List[Any]:
+    return [float(v) if "." in v else int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality/latency across index configurations.")
+    parser.add_argument("--docs", required=True, help="Directory of .txt files (keys are paths relative to it)")
+    parser.add_argument("--labels", required=True, help="JSONL labeled questions")
+    parser.add_argument("--chunk-sizes", default=str(server.CHUNK_SIZE))
+    parser.add_argument("--overlaps", default=str(server.CHUNK_OVERLAP))
+    parser.add_argument("--ngrams", default="-".join(map(str, server.INDEX_NGRAM_RANGE)), help="e.g. 3-5,2-4")
+    parser.add_argument("--vectorizers", default=server.INDEX_VECTORIZER, help="tfidf,hashing")
+    parser.add_argument("--dtypes", default="float64", help="float64,float32")
+    parser.add_argument("--min-dfs", default=str(server.INDEX_MIN_DF))
+    parser.add_argument("--shards", default=str(server.INDEX_SHARDS))
+    parser.add_argument("--top-k", default="1,5,10")
+    parser.add_argument("--recall-tolerance", type=float, default=0.02,
+                        help="Recommend the smallest/fastest config within this recall of the best")
+    parser.add_argument("--json", help="Also write all rows to this JSON file")
+    args = parser.parse_args()
+
+    docs = load_docs(args.docs)
+    labels = load_labels(args.labels)
+    if not docs or not labels:
+        raise SystemExit("Need at least one non-empty .txt document and one labeled question.")
+    top_ks = _ints(args.top_k)
+    print(f"[INFO] {len(docs)} documents, {len(labels)} labeled questions")
+
+    grid = itertools.product(_ints(args.chunk_sizes), _ints(args.overlaps), _ngrams(args.ngrams),
+                             args.vectorizers.split(","), args.dtypes.split(","), _min_dfs(args.min_dfs),
+                             _ints(args.shards))
+    rows = []
+    for chunk_size, overlap, ngram_range, vectorizer, dtype, min_df, shards in grid:
+        if overlap >= chunk_size:
+            continue
+        config = {"chunk_size": chunk_size, "overlap": overlap, "ngram_range": ngram_range,
+                  "vectorizer": vectorizer, "dtype": server.np.float32 if dtype == "float32" else server.np.float64,
+                  "min_df": min_df, "shards": shards}
+        label = (f"size={chunk_size} overlap={overlap} ngram={ngram_range[0]}-{ngram_range[1]} "
+                 f"{vectorizer} {dtype} min_df={min_df} shards={shards}")
+        print(f"[INFO] Evaluating {label}")
+        rows.append({"config": label, **evaluate(config, docs, labels, top_ks)})
+
+    recall_key = f"recall@{max(top_ks)}"
+    columns = ["config"] + [f"recall@{k}" for k in top_ks] + ["mrr", "chunks", "index_mb", "build_s", "p50_ms", "p95_ms"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print()
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for r in rows:
+        print("  ".join(str(r[c]).ljust(widths[c]) for c in columns))
+
+    best = max(r[recall_key] for r in rows)
+    eligible = [r for r in rows if r[recall_key] >= best - args.recall_tolerance]
+    pick = min(eligible, key=lambda r: (r["index_mb"], r["p50_ms"]))
+    print(f"\nSmallest/fastest config within {args.recall_tolerance} of best {recall_key} ({best}): {pick['config']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
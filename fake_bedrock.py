@@ -0,0 +1,164 @@
+# Local fake of the Bedrock runtime invoke_model endpoint.
+# Point server.py at it with BEDROCK_ENDPOINT_URL=http://127.0.0.1:8009 (any dummy AWS credentials work)
+# and inspect the captured request bodies with: curl http://127.0.0.1:8009/requests
+
+import json
+import os
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+PORT = int(os.getenv("FAKE_BEDROCK_PORT", "8009"))
+MAX_CACHE_BREAKPOINTS = 4
+# Like Bedrock, a breakpoint whose prefix is shorter than the model's minimum is silently not cached
+MIN_CACHE_TOKENS = {
+    "claude-haiku-4-5": 4096,
+    "claude-opus-4-5": 4096,
+    "claude-3-5-haiku": 2048,
+    "claude-3-haiku": 2048,
+    "claude-3-7-sonnet": 1024,
+    "claude-sonnet-4": 1024,
+    "claude-opus-4": 1024,
+}
+
+
+def min_cache_tokens(model_id):
+    return next((n for m, n in MIN_CACHE_TOKENS.items() if m in model_id), 1024)
+
+REQUESTS = []        # Captured {"model_id": ..., "body": ...}
+SEEN_PREFIXES = set() # Cacheable prefixes already "written" to the fake cache
+
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def _blocks(body):
+    """Yield every content block in prompt order (system first, then messages)."""
+    system = body.get("system")
+    if isinstance(system, list):
+        yield from system
+    elif isinstance(system, str):
+        yield {"type": "text", "text": system}
+    for msg in body.get("messages", []):
+        content = msg.get("content")
+        if isinstance(content, str):
+            yield {"type": "text", "text": content}
+        else:
+            yield from content or []
+
+
+def validate(body):
+    """Return an error message when the body would be rejected, otherwise None."""
+    if body.get("anthropic_version") != "bedrock-2023-05-31":
+        return "anthropic_version must be bedrock-2023-05-31"
+    if not body.get("messages"):
+        return "messages must not be empty"
+    breakpoints = 0
+    for block in _blocks(body):
+        if "cache_control" in block:
+            breakpoints += 1
+            if block["cache_control"] != {"type": "ephemeral"}:
+                return "cache_control must be {'type': 'ephemeral'}"
+    if breakpoints > MAX_CACHE_BREAKPOINTS:
+        return f"A maximum of {MAX_CACHE_BREAKPOINTS} blocks with cache_control may be provided"
+    return None
+
+
+def usage_for(body, model_id=""):
+    """
+    Simulate prompt caching: the prefix up to each breakpoint is read if seen before, written
+    otherwise. Breakpoints below the model's minimum prompt length cache nothing.
+    """
+    prefix, cached_len, total = "", 0, 0
+    read = written = 0
+    min_tokens = min_cache_tokens(model_id)
+    for block in _blocks(body):
+        text = block.get("text", "")
+        prefix += text
+        total += _estimate_tokens(text)
+        if "cache_control" in block and total >= min_tokens:
+            tokens = total - cached_len
+            if prefix in SEEN_PREFIXES:
+                read += tokens
+            else:
+                SEEN_PREFIXES.add(prefix)
+                written += tokens
+            cached_len = total
+    return {
+        "input_tokens": total - read - written,
+        "cache_read_input_tokens": read,
+        "cache_creation_input_tokens": written,
+        "output_tokens": 8,
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/requests":
+            self._send(200, REQUESTS)
+        else:
+            self._send(404, {"message": "not found"})
+
+    def do_DELETE(self):
+        if self.path == "/requests":
+            REQUESTS.clear()
+            SEEN_PREFIXES.clear()
+            self._send(200, {"ok": True})
+        else:
+            self._send(404, {"message": "not found"})
+
+    def do_POST(self):
+        m = re.match(r"^/model/(.+)/invoke$", self.path)
+        if not m:
+            self._send(404, {"message": "not found"})
+            return
+        model_id = unquote(m.group(1))
+        length = int(self.headers.get("Content-Length", "0"))
+        body = json.loads(self.rfile.read(length).decode("utf-8"))
+        REQUESTS.append({"model_id": model_id, "body": body})
+
+        error = validate(body)
+        if error:
+            print(f"[WARN] Rejected request for {model_id}: {error}")
+            self._send(400, {"message": error}, {"x-amzn-ErrorType": "ValidationException"})
+            return
+
+        usage = usage_for(body, model_id)
+        print(f"[INFO] {model_id}: {usage}")
+        self._send(200, {
+            "id": f"msg_fake_{len(REQUESTS)}",
+            "type": "message",
+            "role": "assistant",
+            "model": model_id,
+            "content": [{"type": "text", "text": "<NO_ANSWER>"}],
+            "stop_reason": "end_turn",
+            "usage": usage,
+        })
+
+    def log_message(self, fmt, *args):
+        pass # Keep the console to the [INFO] lines above
+
+
+def make_server(port=PORT):
+    """Bind the fake (port 0 picks a free port, as the tests do)."""
+    return ThreadingHTTPServer(("127.0.0.1", port), Handler)
+
+
+def main():
+    print(f"[INFO] Fake Bedrock runtime listening on http://127.0.0.1:{PORT}")
+    make_server().serve_forever()
+
+
+if __name__ == "__main__":
+    main()
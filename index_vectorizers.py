@@ -0,0 +1,156 @@
+# Vectorizer configurations for the TF-IDF index.
+# "tfidf"   : sklearn TfidfVectorizer with an explicit n-gram vocabulary (optionally pruned
+#             with min_df / max_features). Needs the whole shard's text in one fit call.
+# "hashing" : HashingVectorizer + a separately learned IDF vector. No vocabulary dict, and
+#             the fit streams over document batches (one pass for document frequencies,
+#             one pass to transform), so raw text never has to be held in RAM all at once.
+# scipy and scikit-learn are imported inside the functions that need them, so importing this
+# module (and server.py) stays cheap until the first fit or query.
+
+import sys
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+class HashedTfidfVectorizer:
+    """Char n-gram hashing features weighted by a smoothed IDF learned from batches."""
+
+    def __init__(self, ngram_range=(3, 5), n_features: int = 2 ** 20, min_df: float = 1,
+                 max_features: Optional[int] = None, dtype=np.float64):
+        self.ngram_range = tuple(ngram_range)
+        self.n_features = n_features
+        self.min_df = min_df
+        self.max_features = max_features
+        self.dtype = dtype
+        self.idf_: Optional[np.ndarray] = None
+        self.features_ = 0 # Buckets seen at fit time and kept by min_df/max_features
+
+    def _hasher(self):
+        from sklearn.feature_extraction.text import HashingVectorizer
+        return HashingVectorizer(analyzer="char", ngram_range=self.ngram_range, n_features=self.n_features,
+                                 alternate_sign=False, norm=None, dtype=self.dtype)
+
+    def counts(self, texts: List[str]):
+        """Raw hashed n-gram counts (no IDF, no normalisation); safe to compute in another process."""
+        X = self._hasher().transform(texts).tocsr()
+        X.sum_duplicates()
+        return X
+
+    def fit_df(self, df: np.ndarray, n_docs: int) -> "HashedTfidfVectorizer":
+        """Learn the IDF from document frequencies, possibly summed over several shards' counts()."""
+        if n_docs == 0:
+            raise ValueError("empty vocabulary; no documents to fit")
+        idf = np.log((1 + n_docs) / (1 + df)) + 1.0
+        seen = df > 0
+        keep = seen.copy()
+        min_df = self.min_df if isinstance(self.min_df, (int, np.integer)) else int(np.ceil(self.min_df * n_docs))
+        keep &= df >= min_df
+        if self.max_features and keep.sum() > self.max_features:
+            cutoff = np.sort(df[keep])[-self.max_features]
+            keep &= df >= cutoff
+        if not keep.any():
+            raise ValueError("empty vocabulary; min_df/max_features pruned every feature")
+        # Pruned buckets contribute nothing. Buckets never seen keep the smoothed IDF log(1+n)+1,
+        # so n-grams that first appear in ingested text are searchable before the next refit.
+        idf[seen & ~keep] = 0.0
+        self.idf_ = idf.astype(self.dtype)
+        self.features_ = int(keep.sum())
+        return self
+
+    def fit_batches(self, batches: Iterable[List[str]]) -> "HashedTfidfVectorizer":
+        df = np.zeros(self.n_features, dtype=np.int64)
+        n_docs = 0
+        for batch in batches:
+            if not batch:
+                continue
+            X = self.counts(batch)
+            df += document_frequencies(X, self.n_features)
+            n_docs += X.shape[0]
+        return self.fit_df(df, n_docs)
+
+    def weight(self, X):
+        """IDF-weight and L2-normalise a counts() matrix."""
+        from scipy import sparse
+        from sklearn.preprocessing import normalize
+        X = sparse.csr_matrix(X.multiply(self.idf_), dtype=self.dtype)
+        X.eliminate_zeros()
+        return normalize(X, norm="l2", copy=False)
+
+    def transform(self, texts: List[str]):
+        return self.weight(self.counts(texts))
+
+
+def document_frequencies(counts, n_features: int) -> np.ndarray:
+    """Per-bucket document frequency of a counts() matrix (duplicates already summed)."""
+    return np.bincount(counts.indices, minlength=n_features).astype(np.int64)
+
+
+def make_vectorizer(kind: str = "tfidf", ngram_range=(3, 5), dtype=np.float64, min_df: float = 1,
+                    max_features: Optional[int] = None, n_features: int = 2 ** 20):
+    if kind == "hashing":
+        return HashedTfidfVectorizer(ngram_range=ngram_range, n_features=n_features, min_df=min_df,
+                                     max_features=max_features, dtype=dtype)
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    return TfidfVectorizer(analyzer="char", ngram_range=tuple(ngram_range), dtype=dtype, min_df=min_df,
+                           max_features=max_features)
+
+
+def hashed_counts(texts: List[str], params: Dict[str, Any]):
+    """
+    Process-pool worker: raw counts() of texts for make_vectorizer(**params). Lives here so
+    spawned workers only import this module, not the server.
+    """
+    params = dict(params)
+    return make_vectorizer(params.pop("kind"), **params).counts(texts)
+
+
+def fit_matrix(vectorizer, batches: Callable[[], Iterable[List[str]]]) -> Tuple[Any, Any]:
+    """
+    Fit `vectorizer` and return (vectorizer, matrix). `batches` is called once per pass
+    and must yield lists of texts in the same order each time.
+    """
+    if isinstance(vectorizer, HashedTfidfVectorizer):
+        from scipy import sparse
+        vectorizer.fit_batches(batches())
+        parts = [vectorizer.transform(batch) for batch in batches() if batch]
+        return vectorizer, sparse.vstack(parts, format="csr")
+    texts = [t for batch in batches() for t in batch]
+    matrix = vectorizer.fit_transform(texts)
+    if getattr(vectorizer, "stop_words_", None) is not None:
+        vectorizer.stop_words_ = None # Pruned terms are only kept for introspection; drop before pickling
+    return vectorizer, matrix
+
+
+def matrix_nbytes(matrix) -> int:
+    return int(matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes)
+
+
+def vectorizer_nbytes(vectorizer) -> int:
+    """Approximate in-memory size of the fitted state (vocabulary dict or IDF vector)."""
+    if isinstance(vectorizer, HashedTfidfVectorizer):
+        return int(vectorizer.idf_.nbytes) if vectorizer.idf_ is not None else 0
+    vocab = getattr(vectorizer, "vocabulary_", None) or {}
+    size = sys.getsizeof(vocab) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in vocab.items())
+    idf = getattr(vectorizer, "idf_", None)
+    return int(size + (idf.nbytes if idf is not None else 0))
+
+
+def footprint(vectorizer, matrix, fit_seconds: float) -> Dict[str, Any]:
+    hashed = isinstance(vectorizer, HashedTfidfVectorizer)
+    return {
+        "vectorizer": "hashing" if hashed else "tfidf",
+        "features": vectorizer.features_ if hashed else len(vectorizer.vocabulary_),
+        "dtype": str(matrix.dtype),
+        "matrix_bytes": matrix_nbytes(matrix),
+        "vectorizer_bytes": vectorizer_nbytes(vectorizer),
+        "fit_seconds": round(fit_seconds, 3),
+    }
+
+
+def timed_fit(vectorizer, batches: Callable[[], Iterable[List[str]]]):
+    """fit_matrix plus a footprint report."""
+    t0 = time.perf_counter()
+    vectorizer, matrix = fit_matrix(vectorizer, batches)
+    return vectorizer, matrix, footprint(vectorizer, matrix, time.perf_counter() - t0)
@@ -0,0 +1,84 @@
+# Cheap change detection for continuous screen capture.
+# Frames are downsampled by plain strided slicing (no resampling), collapsed to one int16
+# intensity plane, and compared cell by cell against the last frame that was sent for
+# analysis. Only the bounding box of the changed cells is cropped out of the full-resolution
+# frame, so small UI updates cost a small image instead of a whole screen.
+
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+
+class ChangeDetector:
+    """Per-monitor diff state; all working buffers are allocated once per frame size."""
+
+    def __init__(self, stride: int = 8, cell: int = 16, cell_threshold: float = 12.0,
+                 min_changed: float = 0.01, padding: int = 1):
+        self.stride = stride               # Keep every stride-th pixel in each direction
+        self.cell = cell                   # Cell edge in downsampled pixels
+        self.cell_threshold = cell_threshold # Mean abs intensity change (0-255) that marks a cell changed
+        self.min_changed = min_changed     # Fraction of cells that must change to trigger
+        self.padding = padding             # Extra cells around the changed region
+        self._shape = None
+        self._gray = self._ref = self._diff = None
+
+    def _alloc(self, shape: Tuple[int, int]):
+        self._shape = shape
+        self._gray = np.empty(shape, dtype=np.int16)
+        self._diff = np.empty(shape, dtype=np.int16)
+        self._ref = None # Resolution changed: the next frame counts as entirely new
+
+    def _intensity(self, frame: np.ndarray) -> np.ndarray:
+        """Sum of the three colour channels (0..765) of the strided view, into the reused buffer."""
+        small = frame[::self.stride, ::self.stride, :3]
+        if small.shape[:2] != self._shape:
+            self._alloc(small.shape[:2])
+        np.sum(small, axis=2, dtype=np.int16, out=self._gray)
+        return self._gray
+
+    def cell_scores(self, frame: np.ndarray) -> Optional[np.ndarray]:
+        """Mean abs change (0-255) per cell against the reference frame, or None without a reference."""
+        gray = self._intensity(frame)
+        if self._ref is None:
+            return None
+        np.subtract(gray, self._ref, out=self._diff)
+        np.abs(self._diff, out=self._diff)
+        c, (h, w) = self.cell, self._shape
+        gh, gw = max(1, h // c), max(1, w // c)
+        # reduceat sums from each cell start to the next; the last row/column also takes the leftover edge
+        sums = np.add.reduceat(np.add.reduceat(self._diff, np.arange(gh) * c, axis=0, dtype=np.int64),
+                               np.arange(gw) * c, axis=1)
+        heights, widths = np.full(gh, c), np.full(gw, c)
+        heights[-1], widths[-1] = h - (gh - 1) * c, w - (gw - 1) * c
+        counts = np.outer(heights, widths)
+        return sums / counts / 3.0
+
+    def check(self, frame: np.ndarray) -> Optional[Dict[str, Any]]:
+        """
+        Compare a full-resolution HxWx(3|4) frame with the last accepted one. Returns None when
+        nothing meaningful changed, else {"box": (left, top, right, bottom) in frame pixels,
+        "changed": fraction of cells, "score": max cell score}. The first frame is always accepted.
+        """
+        scores = self.cell_scores(frame)
+        h, w = frame.shape[:2]
+        if scores is None:
+            return {"box": (0, 0, w, h), "changed": 1.0, "score": 255.0}
+        changed = scores >= self.cell_threshold
+        fraction = float(changed.mean())
+        if fraction < self.min_changed:
+            return None
+        ys, xs = np.nonzero(changed)
+        gh, gw = scores.shape
+        y0, y1 = max(0, int(ys.min()) - self.padding), min(gh, int(ys.max()) + 1 + self.padding)
+        x0, x1 = max(0, int(xs.min()) - self.padding), min(gw, int(xs.max()) + 1 + self.padding)
+        px = self.cell * self.stride
+        # Last row/column of cells also covers the leftover edge pixels
+        box = (x0 * px, y0 * px, w if x1 == gw else x1 * px, h if y1 == gh else y1 * px)
+        return {"box": box, "changed": round(fraction, 4), "score": round(float(scores.max()), 1)}
+
+    def accept(self):
+        """Make the frame last passed to check() the new reference (call once it was sent)."""
+        if self._gray is not None:
+            if self._ref is None:
+                self._ref = np.empty_like(self._gray)
+            np.copyto(self._ref, self._gray)
@@ -19,6 +19,13 @@ import base64
 import pyaudio
 import wave
 import threading
+import argparse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
+from bedrock_scheduler import PRIORITY_BACKGROUND, get_scheduler, sdk_retry_config, set_admit_url
+from upload_spool import UploadSpool
+from screen_change import ChangeDetector
 
 # --- Load environment variables ---
 load_dotenv()
@@ -29,6 +36,35 @@ TXT_BUCKET_NAME = "text-description"
 REGION = "us-east-1"
 LOG_FOLDER = "analysis_logs"
 
+# --- Offline spool: the hotkey path only writes here, a background uploader drains it ---
+SPOOL_DIR = os.getenv("SPOOL_DIR", "upload_spool")
+SPOOL_WORKERS = int(os.getenv("SPOOL_WORKERS", "4"))
+SPOOL_POLL_INTERVAL = float(os.getenv("SPOOL_POLL_INTERVAL", "1.0"))
+SPOOL_MAX_ATTEMPTS = int(os.getenv("SPOOL_MAX_ATTEMPTS", "8"))
+
+# --- Continuous capture: grab frames in the background, analyze only meaningful changes ---
+CONTINUOUS_CAPTURE = os.getenv("CONTINUOUS_CAPTURE", "0") == "1" # Or run with --continuous
+CAPTURE_INTERVAL = float(os.getenv("CAPTURE_INTERVAL", "2.0"))   # Seconds between grabs (caps FPS)
+CAPTURE_COOLDOWN = float(os.getenv("CAPTURE_COOLDOWN", "20"))    # Min seconds between analyses per monitor
+CAPTURE_MONITORS = os.getenv("CAPTURE_MONITORS", "1")            # mss monitor numbers, e.g. "1,2", or "all"
+CAPTURE_STRIDE = int(os.getenv("CAPTURE_STRIDE", "8"))           # Downsample factor for diffing
+CAPTURE_CELL = int(os.getenv("CAPTURE_CELL", "16"))              # Diff cell size in downsampled pixels
+CAPTURE_CELL_THRESHOLD = float(os.getenv("CAPTURE_CELL_THRESHOLD", "12")) # Mean change (0-255) per cell
+CAPTURE_MIN_CHANGED = float(os.getenv("CAPTURE_MIN_CHANGED", "0.01"))     # Fraction of cells that must change
+
+# --- Batch analysis: pack queued screenshots into one converse call ---
+VISION_MODEL_ID = "us.anthropic.claude-haiku-4-5-20251001-v1:0"
+ANALYSIS_MAX_TOKENS = int(os.getenv("ANALYSIS_MAX_TOKENS", "2048"))   # Output budget per image
+ANALYSIS_BATCH_SIZE = min(20, int(os.getenv("ANALYSIS_BATCH_SIZE", "4"))) # Images per call (1 disables; converse allows 20)
+ANALYSIS_BATCH_WAIT = float(os.getenv("ANALYSIS_BATCH_WAIT", "5"))     # Max seconds a screenshot waits for its batch to fill
+
+# --- Bedrock calls are admitted by the server's scheduler so they queue behind /ask (empty = local only) ---
+BEDROCK_ADMIT_URL = os.getenv("BEDROCK_ADMIT_URL", "http://127.0.0.1:8001/scheduler/admit")
+set_admit_url(BEDROCK_ADMIT_URL)
+
+# --- Push new text to the server's /ingest so it is searchable right away (empty disables) ---
+INGEST_URL = os.getenv("INGEST_URL", "http://127.0.0.1:8001/ingest")
+
 AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 
@@ -45,20 +81,40 @@ bedrock_client = boto3.client(
     aws_access_key_id=AWS_ACCESS_KEY_ID,
     aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
     region_name="us-east-1",
+    config=sdk_retry_config(), # Throttling retries go through the shared scheduler
+)
+
+# Shared multipart settings for every spooled upload
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=4,
+    use_threads=True,
 )
 
+spool = UploadSpool(SPOOL_DIR, max_attempts=SPOOL_MAX_ATTEMPTS)
+
 # =====================================================
 # IMAGE ANALYSIS SECTION
 # =====================================================
 
+def estimate_image_tokens(image_bytes):
+    """Rough Claude image token estimate (width * height / 750) for scheduler admission"""
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            return img.width * img.height / 750
+    except Exception:
+        return 1600
+
 def get_description_from_bedrock(image_buffer):
     """Send screenshot to Bedrock for visual analysis"""
     print("\n🤖 Asking Bedrock to analyze the image...")
     try:
-        model_id = "us.anthropic.claude-haiku-4-5-20251001-v1:0"
+        model_id = VISION_MODEL_ID
         user_message = "Analyze this image and provide a detailed description."
 
         image_buffer.seek(0)
+        image_bytes = image_buffer.read()
         conversation = [
             {
                 "role": "user",
@@ -66,7 +122,7 @@ def get_description_from_bedrock(image_buffer):
                     {
                         "image": {
                             "format": "png",
-                            "source": {"bytes": image_buffer.read()},
+                            "source": {"bytes": image_bytes},
                         }
                     },
                     {"text": user_message},
@@ -74,10 +130,16 @@ def get_description_from_bedrock(image_buffer):
             }
         ]
 
-        response = bedrock_client.converse(
-            modelId=model_id,
-            messages=conversation,
-            inferenceConfig={"maxTokens": 2048, "temperature": 0.5},
+        # Background priority: the server's interactive /ask calls go first
+        response = get_scheduler().call(
+            lambda: bedrock_client.converse(
+                modelId=model_id,
+                messages=conversation,
+                inferenceConfig={"maxTokens": ANALYSIS_MAX_TOKENS, "temperature": 0.5},
+            ),
+            priority=PRIORITY_BACKGROUND,
+            est_tokens=estimate_image_tokens(image_bytes) + ANALYSIS_MAX_TOKENS,
+            name="vision analysis",
         )
 
         response_actual = response["output"]["message"]["content"]
@@ -93,6 +155,59 @@ def get_description_from_bedrock(image_buffer):
         print(f"❌ BEDROCK ERROR: {e}")
         return None
 
+def get_batch_descriptions_from_bedrock(images):
+    """
+    Describe several screenshots in one converse call. Returns {position: description} for the
+    images the model answered; raises on call errors and ValueError if the reply is not parseable.
+    """
+    print(f"\n🤖 Asking Bedrock to analyze {len(images)} images in one request...")
+    content = []
+    for n, image_bytes in enumerate(images, start=1):
+        content.append({"text": f"Image {n}:"})
+        content.append({"image": {"format": "png", "source": {"bytes": image_bytes}}})
+    content.append({"text": (
+        f"Analyze each of the {len(images)} images above separately and provide a detailed description of each. "
+        "Reply with only a JSON array, one object per image in order: "
+        '[{"image": 1, "description": "..."}, ...]'
+    )})
+    max_tokens = ANALYSIS_MAX_TOKENS * len(images)
+    response = get_scheduler().call(
+        lambda: bedrock_client.converse(
+            modelId=VISION_MODEL_ID,
+            messages=[{"role": "user", "content": content}],
+            inferenceConfig={"maxTokens": max_tokens, "temperature": 0.5},
+        ),
+        priority=PRIORITY_BACKGROUND,
+        est_tokens=sum(estimate_image_tokens(b) for b in images) + max_tokens,
+        name=f"vision analysis x{len(images)}",
+    )
+    text = "".join(c.get("text", "") for c in response["output"]["message"]["content"])
+    return parse_batch_descriptions(text, len(images))
+
+def parse_batch_descriptions(text, count):
+    """Pull [{"image": n, "description": ...}] out of a reply (tolerates code fences / extra prose)"""
+    start, end = text.find("["), text.rfind("]")
+    if start < 0 or end < start:
+        raise ValueError("no JSON array in batch reply")
+    try:
+        items = json.loads(text[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise ValueError(f"invalid JSON in batch reply: {e}")
+    descriptions = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            n = int(item.get("image"))
+        except (TypeError, ValueError):
+            continue
+        description = item.get("description")
+        if 1 <= n <= count and isinstance(description, str) and description.strip():
+            descriptions[n] = description.strip()
+    if not descriptions:
+        raise ValueError("batch reply described no images")
+    return descriptions
+
 # =====================================================
 # FILE MANAGEMENT
 # =====================================================
@@ -108,59 +223,289 @@ def save_analysis_to_file(analysis_text, log_filename):
     except Exception as e:
         print(f"❌ Error saving log file: {e}")
 
+def encode_png(img):
+    """Downscale to at most 1920px wide and PNG-encode into a rewound buffer"""
+    # --- RESIZE IMAGE ---
+    # Define a maximum width (adjust as needed, 1920 is common HD)
+    max_width = 1920
+    if img.width > max_width:
+        print(f"[INFO] Resizing screenshot from {img.width}x{img.height} to max width {max_width}px...")
+        # Calculate new height to maintain aspect ratio
+        aspect_ratio = img.height / img.width
+        new_height = int(max_width * aspect_ratio)
+        # Resize using a high-quality filter
+        img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
+        print(f"[INFO] Resized to {img.width}x{img.height}")
+    # --- END RESIZE ---
+
+    buf = io.BytesIO()
+    # Save PNG with compression (level 6 is a good balance)
+    img.save(buf, format="PNG", optimize=True, compress_level=6)
+    print(f"[INFO] Screenshot saved to buffer with compression. Size: {buf.tell()} bytes")
+    buf.seek(0) # Reset buffer position to the beginning
+    return buf
+
 def capture_screenshot():
     with mss() as sct:
         # Assuming monitor 1 is your main display. Adjust if needed.
         monitor = sct.monitors[1]
         shot = sct.grab(monitor)
         img = Image.frombytes("RGB", shot.size, shot.rgb)
-
-        # --- RESIZE IMAGE ---
-        # Define a maximum width (adjust as needed, 1920 is common HD)
-        max_width = 1920
-        if img.width > max_width:
-            print(f"[INFO] Resizing screenshot from {img.width}x{img.height} to max width {max_width}px...")
-            # Calculate new height to maintain aspect ratio
-            aspect_ratio = img.height / img.width
-            new_height = int(max_width * aspect_ratio)
-            # Resize using a high-quality filter
-            img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-            print(f"[INFO] Resized to {img.width}x{img.height}")
-        # --- END RESIZE ---
-
-        buf = io.BytesIO()
-        # Save PNG with compression (level 6 is a good balance)
-        img.save(buf, format="PNG", optimize=True, compress_level=6)
-        print(f"[INFO] Screenshot saved to buffer with compression. Size: {buf.tell()} bytes")
-        buf.seek(0) # Reset buffer position to the beginning
-        return buf
+        return encode_png(img)
 
 def upload_image_to_s3(buf, filename):
+    """Spool the screenshot for upload; the background uploader sends it to S3"""
+    buf.seek(0)
+    key = f"screenshots/{filename}"
+    spool.enqueue("upload", buf.read(), bucket=BUCKET_NAME, key=key, content_type="image/png")
+    print(f"📥 Screenshot queued for upload: {key}")
+
+def upload_text_to_s3(text, filename):
+    """Spool text (analysis or transcript) for upload"""
+    key = f"screenshots/{filename}"
+    spool.enqueue("upload", text.encode("utf-8"), bucket=TXT_BUCKET_NAME, key=key,
+                  content_type="text/plain; charset=utf-8", ingest=True)
+    print(f"📥 Text queued for upload: {key}")
+
+def queue_analysis(buf, timestamp):
+    """Spool a screenshot for Bedrock analysis (retried while offline)"""
+    buf.seek(0)
+    spool.enqueue("analyze", buf.read(), timestamp=timestamp)
+
+def queue_transcription(wav_bytes, timestamp):
+    """Spool a recording for Whisper transcription (the audio is kept until a transcript exists)"""
+    spool.enqueue("transcribe", wav_bytes, timestamp=timestamp)
+    print(f"📥 Recording queued for transcription: transcript_{timestamp}")
+
+# =====================================================
+# CONTINUOUS CAPTURE (change-triggered)
+# =====================================================
+
+def _capture_monitors(sct):
+    """(number, monitor) pairs selected by CAPTURE_MONITORS; mss monitor 0 is the union of all screens"""
+    if CAPTURE_MONITORS.strip().lower() == "all":
+        return list(enumerate(sct.monitors))[1:]
+    selected = []
+    for part in CAPTURE_MONITORS.split(","):
+        if not part.strip():
+            continue
+        idx = int(part)
+        if 0 <= idx < len(sct.monitors):
+            selected.append((idx, sct.monitors[idx]))
+        else:
+            print(f"⚠️ Monitor {idx} not found ({len(sct.monitors) - 1} available), skipping.")
+    return selected
+
+def continuous_capture(stop_event):
+    """Grab each monitor every CAPTURE_INTERVAL and spool only the changed region for analysis"""
+    with mss() as sct: # One mss instance for the lifetime of the loop
+        monitors = _capture_monitors(sct)
+        if not monitors:
+            print("❌ No monitors to capture, continuous mode disabled.")
+            return
+        detectors = {idx: ChangeDetector(stride=CAPTURE_STRIDE, cell=CAPTURE_CELL,
+                                         cell_threshold=CAPTURE_CELL_THRESHOLD, min_changed=CAPTURE_MIN_CHANGED)
+                     for idx, _ in monitors}
+        last_sent = {idx: float("-inf") for idx, _ in monitors}
+        print(f"🖥️ Continuous capture on monitor(s) {[idx for idx, _ in monitors]} every {CAPTURE_INTERVAL}s")
+        while not stop_event.is_set():
+            started = time.monotonic()
+            for idx, monitor in monitors:
+                if started - last_sent[idx] < CAPTURE_COOLDOWN:
+                    continue # Don't even grab while cooling down
+                try:
+                    shot = sct.grab(monitor)
+                    # Raw BGRA view of the grab, no copy
+                    frame = np.frombuffer(shot.bgra, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+                    change = detectors[idx].check(frame)
+                    if change is None:
+                        continue
+                    left, top, right, bottom = change["box"]
+                    # Only the changed region is converted to RGB and encoded
+                    img = Image.fromarray(np.ascontiguousarray(frame[top:bottom, left:right, 2::-1]))
+                    timestamp = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_m{idx}"
+                    buf = encode_png(img)
+                    upload_image_to_s3(buf, f"screenshot_{timestamp}.png")
+                    queue_analysis(buf, timestamp)
+                    detectors[idx].accept()
+                    last_sent[idx] = started
+                    print(f"🖥️ Monitor {idx} changed ({change['changed']:.0%} of cells), "
+                          f"queued {img.width}x{img.height} of {shot.width}x{shot.height}")
+                except Exception as e:
+                    print(f"❌ Continuous capture error on monitor {idx}: {e}")
+            stop_event.wait(max(0.0, CAPTURE_INTERVAL - (time.monotonic() - started)))
+
+# =====================================================
+# BACKGROUND UPLOADER (drains the spool)
+# =====================================================
+
+def _process_upload(entry):
+    s3.upload_file(
+        Filename=spool.payload_path(entry),
+        Bucket=entry["bucket"],
+        Key=entry["key"],
+        ExtraArgs={"ContentType": entry["content_type"]},
+        Config=TRANSFER_CONFIG,
+    )
+    print(f"✅ Uploaded: s3://{entry['bucket']}/{entry['key']}")
+    if entry.get("ingest"):
+        post_to_ingest(entry["key"], spool.read_payload(entry).decode("utf-8", errors="ignore"))
+
+def post_to_ingest(key, text):
+    """Best effort: the text is already in S3, so a later /reload still picks it up"""
+    if not INGEST_URL:
+        return
     try:
-        key = f"screenshots/{filename}"
-        buf.seek(0)
-        s3.upload_fileobj(
-            Fileobj=buf,
-            Bucket=BUCKET_NAME,
-            Key=key,
-            ExtraArgs={"ContentType": "image/png"},
+        req = urllib.request.Request(
+            INGEST_URL,
+            data=json.dumps({"documents": [{"key": key, "text": text}]}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
         )
-        print(f"✅ Screenshot uploaded: {key}")
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            result = json.loads(resp.read().decode("utf-8"))
+        print(f"🔎 Indexed on server: {key} ({result.get('ingested_chunks', 0)} chunks)")
     except Exception as e:
-        print(f"❌ S3 Upload error: {e}")
+        print(f"⚠️ Could not post {key} to {INGEST_URL}: {e}")
+
+def _write_analysis(timestamp, analysis):
+    log_filename = f"analysis_{timestamp}.txt"
+    save_analysis_to_file(analysis, log_filename)
+    upload_text_to_s3(analysis, log_filename) # Upload analysis text
+
+def _process_analysis(entry):
+    analysis = get_description_from_bedrock(io.BytesIO(spool.read_payload(entry)))
+    if not analysis:
+        raise RuntimeError("Bedrock analysis failed")
+    _write_analysis(entry["timestamp"], analysis)
+
+def _process_transcription(entry):
+    text = transcribe_with_whisper(spool.read_payload(entry))
+    if text is None:
+        raise RuntimeError("Whisper transcription failed")
+    if not text:
+        print(f"⚠️ Empty transcript for recording {entry['timestamp']}, nothing to upload.")
+        return
+    upload_text_to_s3(text, f"transcript_{entry['timestamp']}.txt") # Upload transcript
+
+SPOOL_HANDLERS = {"upload": _process_upload, "analyze": _process_analysis, "transcribe": _process_transcription}
+
+def _fail_entry(entry, e):
+    if spool.retry(entry, f"{type(e).__name__}: {e}"):
+        print(f"⚠️ Spool {entry['kind']} failed ({e}); attempt {entry['attempts']}, will retry.")
+    else:
+        print(f"❌ Spool {entry['kind']} gave up after {entry['attempts']} attempts: {e}")
 
-def upload_text_to_s3(text, filename):
+def _run_entry(entry, in_flight, in_flight_lock):
     try:
-        key = f"screenshots/{filename}"
-        s3.put_object(
-            Bucket=TXT_BUCKET_NAME,
-            Key=key,
-            Body=text.encode("utf-8"),
-            ContentType="text/plain; charset=utf-8",
-        )
-        print(f"✅ Text uploaded: {key}")
+        SPOOL_HANDLERS[entry["kind"]](entry)
+        spool.complete(entry)
     except Exception as e:
-        print(f"❌ Text upload error: {e}")
+        _fail_entry(entry, e)
+    finally:
+        with in_flight_lock:
+            in_flight.discard(entry["id"])
+
+class BatchAnalyzer:
+    """Collects spooled "analyze" entries and sends them as multi-image calls, flushed by size or age"""
+
+    def __init__(self, pool, in_flight, in_flight_lock, batch_size=ANALYSIS_BATCH_SIZE, max_wait=ANALYSIS_BATCH_WAIT):
+        self.pool = pool
+        self.in_flight = in_flight
+        self.in_flight_lock = in_flight_lock
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._pending = []
+        self._oldest = None
+        self._lock = threading.Lock()
+
+    def _take(self):
+        batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+        self._oldest = time.monotonic() if self._pending else None
+        return batch
+
+    def add(self, entry):
+        with self._lock:
+            self._pending.append(entry)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            batch = self._take() if len(self._pending) >= self.batch_size else None
+        if batch:
+            self.pool.submit(self._run, batch)
+
+    def flush_due(self):
+        """Send the waiting batch once its oldest screenshot has waited max_wait seconds"""
+        with self._lock:
+            due = self._pending and time.monotonic() - self._oldest >= self.max_wait
+            batch = self._take() if due else None
+        if batch:
+            self.pool.submit(self._run, batch)
+
+    def _release(self, entry):
+        with self.in_flight_lock:
+            self.in_flight.discard(entry["id"])
+
+    def _run(self, batch):
+        if len(batch) == 1:
+            return _run_entry(batch[0], self.in_flight, self.in_flight_lock)
+        images, ready = [], []
+        for entry in batch:
+            try:
+                images.append(spool.read_payload(entry))
+                ready.append(entry)
+            except Exception as e:
+                _fail_entry(entry, e)
+                self._release(entry)
+        if not ready:
+            return
+        try:
+            descriptions = get_batch_descriptions_from_bedrock(images)
+        except ValueError as e:
+            print(f"⚠️ Could not parse batch analysis ({e}); analyzing {len(ready)} images one by one.")
+            descriptions = {}
+        except Exception as e:
+            print(f"❌ BEDROCK ERROR: {e}")
+            for entry in ready:
+                _fail_entry(entry, e)
+                self._release(entry)
+            return
+        for n, entry in enumerate(ready, start=1):
+            description = descriptions.get(n)
+            if description is None: # Missing from the reply: fall back to a single-image call
+                _run_entry(entry, self.in_flight, self.in_flight_lock)
+                continue
+            try:
+                print(f"\n--- Response ({entry['timestamp']}) ---\n{description}\n")
+                _write_analysis(entry["timestamp"], f"--- Response ---\n{description}")
+                spool.complete(entry)
+            except Exception as e:
+                _fail_entry(entry, e)
+            finally:
+                self._release(entry)
+
+def spool_uploader(stop_event):
+    """Drain the spool with concurrent transfers until stop_event is set"""
+    in_flight, in_flight_lock = set(), threading.Lock()
+    with ThreadPoolExecutor(max_workers=SPOOL_WORKERS, thread_name_prefix="spool") as pool:
+        analyzer = BatchAnalyzer(pool, in_flight, in_flight_lock)
+        while not stop_event.is_set():
+            try:
+                for entry in spool.ready():
+                    if entry.get("kind") not in SPOOL_HANDLERS:
+                        print(f"[WARN] Unknown spool entry kind: {entry.get('kind')}")
+                        continue
+                    with in_flight_lock:
+                        if entry["id"] in in_flight:
+                            continue
+                        in_flight.add(entry["id"])
+                    if entry["kind"] == "analyze" and ANALYSIS_BATCH_SIZE > 1:
+                        analyzer.add(entry)
+                    else:
+                        pool.submit(_run_entry, entry, in_flight, in_flight_lock)
+                analyzer.flush_due()
+            except Exception as e:
+                print(f"❌ Spool scan error: {e}")
+            stop_event.wait(SPOOL_POLL_INTERVAL)
 
 # =====================================================
 # AUDIO RECORDING + WHISPER TRANSCRIPTION
@@ -247,14 +592,10 @@ def toggle_recording():
             audio_data_bytes = audio_buffer.read()
             print(f"✅ Audio processed in memory ({len(audio_data_bytes)} bytes)")
 
-            # Transcribe directly from memory bytes
-            text = transcribe_with_whisper(audio_data_bytes) # Pass bytes
-            if text:
-                timestamp_str = datetime.now().strftime('%Y%m%d_%H%M%S')
-                s3_text_filename = f"transcript_{timestamp_str}.txt"
-                upload_text_to_s3(text, s3_text_filename) # Upload transcript
+            # Only a local spool write on the hotkey thread; Whisper runs in the background uploader
+            queue_transcription(audio_data_bytes, datetime.now().strftime('%Y%m%d_%H%M%S'))
         except Exception as e:
-             print(f"❌ Error processing or transcribing audio from memory: {e}")
+             print(f"❌ Error processing audio from memory: {e}")
         finally:
             audio_buffer.close() # Close the memory buffer
 
@@ -286,11 +627,16 @@ def transcribe_with_whisper(audio_data_bytes): # Changed parameter
         })
 
         print("🤖 Asking Bedrock Whisper to transcribe audio...")
-        response = bedrock_client.invoke_model(
-            modelId=whisper_arn, # Use variable
-            contentType='application/json',
-            accept='application/json',
-            body=body
+        response = get_scheduler().call(
+            lambda: bedrock_client.invoke_model(
+                modelId=whisper_arn, # Use variable
+                contentType='application/json',
+                accept='application/json',
+                body=body
+            ),
+            priority=PRIORITY_BACKGROUND,
+            est_tokens=1000,
+            name="whisper transcription",
         )
 
         response_body_str = response['body'].read().decode('utf-8')
@@ -362,14 +708,10 @@ def on_press(key):
 
         print("\n📸 Capturing screenshot...")
         buf = capture_screenshot()
-        analysis = get_description_from_bedrock(buf)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        if analysis:
-            log_filename = f"analysis_{timestamp}.txt"
-            save_analysis_to_file(analysis, log_filename)
-            upload_text_to_s3(analysis, log_filename) # Upload analysis text
-        # Upload screenshot regardless of analysis result
+        # Only local spool writes here; analysis and uploads happen in the background
         upload_image_to_s3(buf, f"screenshot_{timestamp}.png")
+        queue_analysis(buf, timestamp)
         
 def verify_aws():
     try:
@@ -386,13 +728,25 @@ def verify_aws():
         raise
 
 def main():
+    parser = argparse.ArgumentParser(description="Screenshot / voice capture helper")
+    parser.add_argument("--continuous", action="store_true", default=CONTINUOUS_CAPTURE,
+                        help="Also capture in the background whenever the screen changes")
+    args = parser.parse_args()
     verify_aws()
+    pending = spool.depth()
+    if pending:
+        print(f"📦 Resuming {pending} pending spool entries from {SPOOL_DIR}/")
+    stop_event = threading.Event()
+    threading.Thread(target=spool_uploader, args=(stop_event,), daemon=True).start()
+    if args.continuous:
+        threading.Thread(target=continuous_capture, args=(stop_event,), daemon=True).start()
     print("📸 Listening for global keys:")
     print("   Enter → Screenshot + Analyze")
     print("   Space → Record voice + Whisper Transcription")
     print("   Esc   → Exit")
     with keyboard.Listener(on_press=on_press) as listener:
         listener.join()
+    stop_event.set() # Anything still pending stays on disk for the next run
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
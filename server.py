@@ -1,25 +1,37 @@
 # backend/server.py
+import time
+PROCESS_START = time.time() # Cold-start clock; reported under "startup" in /health
 import os
 import json
-from typing import List, Dict, Any, Tuple
+import re
+import uuid
+import heapq
+import itertools
+import multiprocessing
+import pickle
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple, Optional
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import boto3
+import numpy as np # Needed by the corpus store at import; scipy/sklearn/boto3 load on first use
 import subprocess
 import sys
 import signal
 import atexit
-import time # Added for sleep
-import boto3
-import botocore 
+import threading
+from corpus_store import SOURCE_TYPES, CorpusStore
+import index_vectorizers
+from bedrock_scheduler import (PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, SchedulerTimeout, get_scheduler,
+                               is_throttle, sdk_retry_config, set_admit_url)
 
 # ========= Load .env file =========
 from dotenv import load_dotenv
 load_dotenv()
+set_admit_url("") # This process is the admitting side for BEDROCK_ADMIT_URL
 # ======================================
 
 # ========= S3 CONFIG =========
@@ -31,6 +43,45 @@ REGION = os.getenv("AWS_REGION", "us-east-1")
 # ========= BEDROCK CONFIG =========
 LLM_MODEL_ID = os.getenv("LLM_MODEL_ID", "us.anthropic.claude-haiku-4-5-20251001-v1:0") # Or your Inference Profile
 MAX_TOKENS = int(os.getenv("MAX_TOKENS", "600"))
+# Max seconds an /ask call waits for scheduler admission before returning 503
+BEDROCK_ADMIT_TIMEOUT = float(os.getenv("BEDROCK_ADMIT_TIMEOUT", "30"))
+# Optional endpoint override, e.g. http://127.0.0.1:8009 for fake_bedrock.py
+BEDROCK_ENDPOINT_URL = os.getenv("BEDROCK_ENDPOINT_URL") or None
+# Prompt caching: stable prefix (system + instructions) and the context block are marked cacheable
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "1") == "1"
+# Model ID substrings that support Anthropic prompt caching on Bedrock
+PROMPT_CACHE_MODELS = [m.strip() for m in os.getenv(
+    "PROMPT_CACHE_MODELS",
+    "claude-3-5-haiku,claude-3-7-sonnet,claude-sonnet-4,claude-opus-4,claude-haiku-4",
+).split(",") if m.strip()]
+# Minimum prompt length (tokens) up to a breakpoint before Bedrock caches it. Shorter prefixes are
+# silently not cached, so breakpoints below the minimum are left off. First matching substring wins.
+PROMPT_CACHE_MIN_TOKENS: Dict[str, int] = {
+    "claude-haiku-4-5": 4096,
+    "claude-opus-4-5": 4096,
+    "claude-3-5-haiku": 2048,
+    "claude-3-haiku": 2048,
+    "claude-3-7-sonnet": 1024,
+    "claude-sonnet-4": 1024,
+    "claude-opus-4": 1024,
+}
+PROMPT_CACHE_MIN_TOKENS.update(json.loads(os.getenv("PROMPT_CACHE_MIN_TOKENS", "{}")))
+
+# ========= MODEL ROUTING =========
+# Easy questions (high top score, short context, clear margin) go to ROUTER_FAST_MODEL_ID first and
+# escalate to LLM_MODEL_ID on <NO_ANSWER>. Routing is off while ROUTER_FAST_MODEL_ID is empty.
+ROUTER_FAST_MODEL_ID = os.getenv("ROUTER_FAST_MODEL_ID", "")
+ROUTER_FAST_MAX_TOKENS = int(os.getenv("ROUTER_FAST_MAX_TOKENS", "300"))
+ROUTER_MIN_TOP_SCORE = float(os.getenv("ROUTER_MIN_TOP_SCORE", "0.35"))
+ROUTER_MIN_MARGIN = float(os.getenv("ROUTER_MIN_MARGIN", "0.05"))
+ROUTER_MAX_CONTEXT_CHARS = int(os.getenv("ROUTER_MAX_CONTEXT_CHARS", "3000"))
+# USD per 1K tokens as [input, output]; JSON override merged over the defaults
+MODEL_PRICES: Dict[str, List[float]] = {
+    "us.anthropic.claude-haiku-4-5-20251001-v1:0": [0.001, 0.005],
+    "us.anthropic.claude-3-5-haiku-20241022-v1:0": [0.0008, 0.004],
+    "us.anthropic.claude-3-haiku-20240307-v1:0": [0.00025, 0.00125],
+}
+MODEL_PRICES.update(json.loads(os.getenv("MODEL_PRICES", "{}")))
 
 # ========= Process Management =========
 screenshot_process: subprocess.Popen | None = None
@@ -46,20 +97,25 @@ if not os.path.exists(SCREENSHOT_SCRIPT_PATH):
 # AWS Client Functions
 # ================================
 def s3_client():
+    import boto3 # Lazy: boto3 is slow to import and only needed once we talk to AWS
     # Credentials should now be loaded from .env if not found elsewhere
     return boto3.client("s3", region_name=REGION)
 
 def bedrock_runtime():
+    import boto3
     # Credentials should now be loaded from .env
-    return boto3.client("bedrock-runtime", region_name=REGION)
+    # Retries are handled by the shared scheduler, not the SDK
+    return boto3.client("bedrock-runtime", region_name=REGION, endpoint_url=BEDROCK_ENDPOINT_URL,
+                        config=sdk_retry_config())
 
 # ================================
 # Data Loading and Indexing Functions
 # ================================
-def read_txt_files_from_s3() -> List[Tuple[str, str]]:
-    """Load all .txt files under the configured prefixes."""
+def read_txt_files_from_s3() -> List[Tuple[str, str, float]]:
+    """Load all .txt files under the configured prefixes as (key, text, LastModified epoch)."""
     s3 = s3_client()
-    docs: List[Tuple[str, str]] = []
+    from botocore.exceptions import ClientError # botocore is already loaded by s3_client()
+    docs: List[Tuple[str, str, float]] = []
     paginator = s3.get_paginator("list_objects_v2")
     print(f"[INFO] Reading from bucket '{BUCKET_NAME}' with prefixes: {PREFIXES}")
     for prefix in PREFIXES:
@@ -84,7 +140,8 @@ def read_txt_files_from_s3() -> List[Tuple[str, str]]:
                         body = s3.get_object(Bucket=BUCKET_NAME, Key=key)["Body"].read()
                         text = body.decode("utf-8", errors="ignore")
                         if text.strip(): # Ensure content is not just whitespace
-                           docs.append((key, text))
+                           last_modified = obj["LastModified"].timestamp() if obj.get("LastModified") else time.time()
+                           docs.append((key, text, last_modified))
                         else:
                             print(f"[WARN] Skipping file with only whitespace: {key}")
 
@@ -95,7 +152,7 @@ def read_txt_files_from_s3() -> List[Tuple[str, str]]:
             # Check bucket existence and permissions
             try:
                 s3.head_bucket(Bucket=BUCKET_NAME)
-            except botocore.exceptions.ClientError as err:
+            except ClientError as err:
                  error_code = err.response.get("Error", {}).get("Code")
                  if error_code == '404':
                      print(f"[ERROR] Bucket '{BUCKET_NAME}' not found.")
@@ -133,60 +190,594 @@ def chunk_text(text: str, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
     return chunks
 
 
-def build_corpus():
-    docs = read_txt_files_from_s3()
+_KEY_TS_RE = re.compile(r"(analysis|transcript|screenshot)_(\d{8}_\d{6})")
+
+def key_metadata(key: str) -> Dict[str, Any]:
+    """Prefix, source type and capture time parsed from keys like screenshots/analysis_YYYYMMDD_HHMMSS.txt."""
+    prefix = next((p.strip() for p in PREFIXES if p.strip() and key.startswith(p.strip())), None)
+    if prefix is None:
+        prefix = key.split("/")[0] + "/" if "/" in key else ""
+    base = key.rsplit("/", 1)[-1]
+    source = "screenshot" if base.startswith("analysis_") else "transcript" if base.startswith("transcript_") else "other"
+    ts = None
+    m = _KEY_TS_RE.search(base)
+    if m:
+        try:
+            ts = datetime.strptime(m.group(2), "%Y%m%d_%H%M%S").timestamp() # Local time, as the helper writes it
+        except ValueError:
+            pass
+    return {"prefix": prefix, "source": source, "ts": ts}
+
+def chunk_documents(docs: List[Tuple[str, str, float]]):
     corpus, meta = [], []
     loaded_files = set()
-    for fname, content in docs:
+    for fname, content, last_modified in docs:
         if not content.strip(): # Skip if content is empty after read
             print(f"[WARN] Skipping empty content from file: {fname}")
             continue
         loaded_files.add(fname.split('/')[0] if '/' in fname else fname)
-        chunks = chunk_text(content)
+        chunks = chunk_text(content, CHUNK_SIZE, CHUNK_OVERLAP) # Read at call time so callers can retune
         if not chunks:
              print(f"[WARN] No chunks generated for file: {fname}")
              continue
+        key_meta = key_metadata(fname)
         for idx, ch in enumerate(chunks):
             corpus.append(ch)
-            meta.append({"file": fname, "chunk_id": idx})
+            meta.append({"file": fname, "chunk_id": idx, **key_meta, "last_modified": last_modified})
     print(f"[INFO] loaded files={len(loaded_files)}, chunks={len(corpus)}")
     return corpus, meta
 
-VECTORIZER = TfidfVectorizer(analyzer="char", ngram_range=(3,5))
-CORPUS: List[str] = []
-META: List[Dict[str, Any]] = []
-MATRIX = None
+def build_corpus(docs: Optional[List[Tuple[str, str, float]]] = None):
+    """Chunk the given (key, text, last_modified) docs, or everything under PREFIXES in S3."""
+    return chunk_documents(read_txt_files_from_s3() if docs is None else docs)
 
-def build_index():
-    global CORPUS, META, MATRIX
-    print("[INFO] Building index...")
-    CORPUS, META = build_corpus()
-    if not CORPUS:
-        print("[WARN] Corpus is empty. No text found in S3 to index.")
-        MATRIX = None
-        return
+# ========= VECTORIZER =========
+# "tfidf" keeps an n-gram vocabulary; "hashing" uses HashingVectorizer + a separate IDF (no vocabulary
+# dict, streamable fit over INDEX_FIT_BATCH-sized batches). See index_vectorizers.py.
+INDEX_VECTORIZER = os.getenv("INDEX_VECTORIZER", "tfidf")
+INDEX_DTYPE = np.float32 if os.getenv("INDEX_DTYPE", "float64") == "float32" else np.float64
+INDEX_NGRAM_RANGE = tuple(int(x) for x in os.getenv("INDEX_NGRAM_RANGE", "3,5").split(","))
+_min_df = os.getenv("INDEX_MIN_DF", "1")
+INDEX_MIN_DF = float(_min_df) if "." in _min_df else int(_min_df) # int = document count, float = fraction
+INDEX_MAX_FEATURES = int(os.getenv("INDEX_MAX_FEATURES", "0")) or None
+INDEX_HASH_FEATURES = int(os.getenv("INDEX_HASH_FEATURES", str(2 ** 20)))
+INDEX_FIT_BATCH = int(os.getenv("INDEX_FIT_BATCH", "2048"))
+
+def vectorizer_params() -> Dict[str, Any]:
+    """Current vectorizer settings, passed explicitly to build workers (spawned workers re-read the env)."""
+    return {"kind": INDEX_VECTORIZER, "ngram_range": INDEX_NGRAM_RANGE, "dtype": INDEX_DTYPE,
+            "min_df": INDEX_MIN_DF, "max_features": INDEX_MAX_FEATURES, "n_features": INDEX_HASH_FEATURES}
+
+def make_vectorizer(params: Optional[Dict[str, Any]] = None):
+    params = dict(params or vectorizer_params())
+    return index_vectorizers.make_vectorizer(params.pop("kind"), **params)
+
+# ========= INDEX SHARDING =========
+INDEX_SHARDS = int(os.getenv("INDEX_SHARDS", "1"))
+INDEX_SHARD_BY = os.getenv("INDEX_SHARD_BY", "time") # "time" (contiguous time ranges) or "hash" (by file key)
+INDEX_BUILD_WORKERS = int(os.getenv("INDEX_BUILD_WORKERS", "0")) or (os.cpu_count() or 1)
+# Shards whose newest chunk is older than this are pickled to INDEX_COLD_DIR and only
+# loaded again for queries whose since/until range reaches them. 0 keeps every shard hot.
+INDEX_SHARD_RETENTION_DAYS = float(os.getenv("INDEX_SHARD_RETENTION_DAYS", "0"))
+INDEX_COLD_DIR = os.getenv("INDEX_COLD_DIR", os.path.join(PROJECT_ROOT, "index_cold"))
+
+_FIT_SEQ = itertools.count() # Identifies a fitted vectorizer (query-vector cache key)
+
+class IndexShard:
+    """
+    One partition of the corpus's TF-IDF matrix rows. All shards share one vectorizer (vocabulary
+    and IDF fitted over the whole corpus), so their cosine scores are comparable when merged.
+    """
+
+    def __init__(self, shard_id: int, rows, vectorizer, matrix, ts_range: Tuple[float, float],
+                 footprint: Optional[Dict[str, Any]] = None, fit_id: Optional[int] = None):
+        self.shard_id = shard_id
+        self.rows = rows                # Global row ids into STORE, aligned with matrix rows
+        self.vectorizer = vectorizer    # Shared by every shard; stays in memory while retired
+        self.matrix = matrix            # None while retired to disk
+        self.ts_min, self.ts_max = ts_range
+        self.stale_rows = 0             # Rows appended with the old IDF
+        self.cold_path: Optional[str] = None
+        self.footprint = footprint or {} # Memory/latency report from the last fit
+        self.fit_id = next(_FIT_SEQ) if fit_id is None else fit_id
+
+    @property
+    def hot(self) -> bool:
+        return self.matrix is not None
+
+    def overlaps(self, lo: Optional[float], hi: Optional[float]) -> bool:
+        return not ((lo is not None and self.ts_max < lo) or (hi is not None and self.ts_min > hi))
+
+    def load(self):
+        print(f"[INFO] Cold-loading index shard {self.shard_id} from {self.cold_path}")
+        with open(self.cold_path, "rb") as f:
+            self.matrix = pickle.load(f)
+
+    def drop_cold(self):
+        if self.cold_path and os.path.exists(self.cold_path):
+            os.remove(self.cold_path)
+        self.cold_path = None
+
+    def describe(self) -> Dict[str, Any]:
+        return {"shard_id": self.shard_id, "rows": int(len(self.rows)), "hot": self.hot,
+                "ts_min": self.ts_min, "ts_max": self.ts_max, "stale_rows": self.stale_rows,
+                "shape": self.matrix.shape if self.hot else None, "footprint": self.footprint}
+
+# Corpus text and per-chunk metadata (see corpus_store.py); CORPUS_COMPRESSION=zstd compresses text blocks
+CORPUS_COMPRESSION = os.getenv("CORPUS_COMPRESSION", "") or None
+CORPUS_BLOCK_CHUNKS = int(os.getenv("CORPUS_BLOCK_CHUNKS", "256"))
+
+def new_store() -> CorpusStore:
+    return CorpusStore(compression=CORPUS_COMPRESSION, block_size=CORPUS_BLOCK_CHUNKS)
+
+STORE = new_store()
+SHARDS: List[IndexShard] = []
+SHARD_BUCKETS = max(1, INDEX_SHARDS) # Shard count SHARDS was partitioned into (hash ingests must keep using it)
+# Guards swaps of SHARDS/STORE and shard mutation; readers take references and go
+INDEX_LOCK = threading.RLock()
+INDEX_VERSION = 0           # Bumped on every build, ingest, refit, shard retire and cold-load
+INDEX_REFIT_INTERVAL = float(os.getenv("INDEX_REFIT_INTERVAL", "600")) # seconds, 0 disables
+_SEARCH_POOL: Optional[ThreadPoolExecutor] = None
+_SEARCH_POOL_LOCK = threading.Lock()
+# Documents ingested during each in-flight build_index, replayed into the new index before the swap
+_BUILD_WATCHERS: List[List[Tuple[str, str, float]]] = []
+
+def index_ready() -> bool:
+    return bool(SHARDS)
+
+def _effective_ts(cols: Dict[str, Any]):
+    """Capture time from the key, falling back to S3 LastModified."""
+    return np.where(np.isnan(cols["ts"]), cols["last_modified"], cols["ts"])
+
+def _ts_range(ts) -> Tuple[float, float]:
+    return (float(ts.min()), float(ts.max())) if len(ts) else (float("inf"), float("-inf"))
+
+def _fit_batches(batches, params: Optional[Dict[str, Any]] = None):
+    """Fit a fresh vectorizer; returns (vectorizer, matrix, footprint) or (None, None, None) on failure."""
     try:
-        MATRIX = VECTORIZER.fit_transform(CORPUS)
-        print(f"[INFO] TF-IDF index built: {MATRIX.shape}")
+        return index_vectorizers.timed_fit(make_vectorizer(params), batches)
     except ValueError as ve:
-         if "empty vocabulary" in str(ve):
-             print("[ERROR] TF-IDF failed: Vocabulary is empty. Check input text content.")
+         if "empty vocabulary" in str(ve) or "min_df" in str(ve):
+             print(f"[ERROR] TF-IDF failed: {ve}. Check input text content and INDEX_MIN_DF/INDEX_MAX_FEATURES.")
          else:
               print(f"[ERROR] TF-IDF failed during fit_transform: {ve}")
-         MATRIX = None
     except Exception as e:
         print(f"[ERROR] Failed to build TF-IDF index: {type(e).__name__}: {e}")
-        MATRIX = None
+    return None, None, None
+
+def _fit(corpus: List[str], params: Optional[Dict[str, Any]] = None):
+    """Fit on an in-memory list of texts (used by first ingests)."""
+    return _fit_batches(lambda: (corpus[i:i + INDEX_FIT_BATCH] for i in range(0, len(corpus), INDEX_FIT_BATCH)),
+                        params)
+
+def _fit_rows(store: CorpusStore, rows):
+    """Fit by streaming shard rows out of the store batch by batch."""
+    return _fit_batches(lambda: (store.texts(rows[i:i + INDEX_FIT_BATCH]) for i in range(0, len(rows), INDEX_FIT_BATCH)))
+
+def _shard_for_file(key: str, n: int) -> int:
+    return zlib.crc32(key.encode("utf-8")) % n
+
+def partition_rows(store: CorpusStore, n: int, by: str = INDEX_SHARD_BY):
+    """
+    Split row ids into up to n shards, by time range or by file-key hash. Returns
+    [(shard_id, rows)] for the non-empty shards; in hash mode shard_id is the hash bucket.
+    """
+    cols = store.columns()
+    if by == "hash":
+        n = max(1, n) # Empty buckets are kept as ids so later ingests hash the same way
+        file_shard = np.array([_shard_for_file(f, n) for f in store.files], dtype=np.int64)
+        ids = file_shard[cols["file_id"]]
+        parts = [np.flatnonzero(ids == i) for i in range(n)]
+    else:
+        n = max(1, min(n, len(store)))
+        order = np.argsort(_effective_ts(cols), kind="stable")
+        parts = np.array_split(order, n)
+    return [(shard_id, p.astype(np.int64)) for shard_id, p in enumerate(parts) if p.size]
+
+def _fit_hashed_parts(store: CorpusStore, parts, params: Dict[str, Any]):
+    """Hash each shard in a worker, sum the document frequencies, then weight every shard with one IDF."""
+    # Spawn, not fork: this runs on the index-build/refit threads while uvicorn, the search pool and
+    # the scheduler hold locks, and a forked child can inherit them locked
+    with ProcessPoolExecutor(max_workers=min(INDEX_BUILD_WORKERS, len(parts)),
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        # Module globals changed at runtime (eval_retrieval.configure) do not reach spawned workers
+        counts = list(pool.map(index_vectorizers.hashed_counts, (store.texts(p) for p in parts),
+                               itertools.repeat(params)))
+    vectorizer = make_vectorizer(params)
+    df = sum(index_vectorizers.document_frequencies(X, vectorizer.n_features) for X in counts)
+    vectorizer.fit_df(df, sum(X.shape[0] for X in counts))
+    return vectorizer, [vectorizer.weight(X) for X in counts]
+
+def _fit_parts(store: CorpusStore, parts):
+    """
+    Fit one vocabulary/IDF over all shards and return (vectorizer, [matrix per part], fit seconds),
+    or (None, [], 0) on failure. Hashing shards are hashed in a process pool; the tfidf vocabulary
+    needs a single fit over the whole corpus.
+    """
+    params = vectorizer_params()
+    t0 = time.perf_counter()
+    if len(parts) > 1 and INDEX_BUILD_WORKERS > 1 and params["kind"] == "hashing":
+        try:
+            vectorizer, matrices = _fit_hashed_parts(store, parts, params)
+            return vectorizer, matrices, time.perf_counter() - t0
+        except Exception as e:
+            print(f"[WARN] Parallel shard build failed ({type(e).__name__}: {e}); building sequentially.")
+    vectorizer, matrix, _ = _fit_rows(store, np.concatenate(parts))
+    if matrix is None:
+        return None, [], 0.0
+    bounds = np.cumsum([0] + [len(p) for p in parts])
+    return vectorizer, [matrix[a:b] for a, b in zip(bounds[:-1], bounds[1:])], time.perf_counter() - t0
+
+def _shard_footprint(vectorizer, matrix, fit_s: float, shared: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Footprint of one shard's matrix; the shared vectorizer's part is measured once and reused."""
+    if shared is None:
+        return index_vectorizers.footprint(vectorizer, matrix, fit_s)
+    return {**shared, "matrix_bytes": index_vectorizers.matrix_nbytes(matrix), "fit_seconds": round(fit_s, 3)}
 
-def search(query: str, top_k=5):
-    if MATRIX is None or MATRIX.shape[0] == 0:
+def build_shards(store: CorpusStore, n: int) -> List[IndexShard]:
+    parts = partition_rows(store, n, INDEX_SHARD_BY)
+    eff_ts = _effective_ts(store.columns())
+    vectorizer, matrices, fit_s = _fit_parts(store, [rows for _, rows in parts])
+    if vectorizer is None:
+        print(f"[WARN] Index could not be built; its {len(store)} chunks are not searchable.")
+        return []
+    fit_id = next(_FIT_SEQ)
+    shared = _shard_footprint(vectorizer, matrices[0], fit_s)
+    shards = [IndexShard(shard_id, rows, vectorizer, matrix, _ts_range(eff_ts[rows]),
+                         _shard_footprint(vectorizer, matrix, fit_s, shared), fit_id)
+              for (shard_id, rows), matrix in zip(parts, matrices)]
+    print(f"[INFO] Built {len(shards)} shard(s) by {INDEX_SHARD_BY} in {fit_s:.2f}s")
+    print(f"[INFO] Index footprint ({INDEX_VECTORIZER}, {np.dtype(INDEX_DTYPE).name}): "
+          f"matrix={sum(sh.footprint['matrix_bytes'] for sh in shards) / 1e6:.1f}MB "
+          f"vectorizer={shards[0].footprint['vectorizer_bytes'] / 1e6:.1f}MB (shared) "
+          f"features={shards[0].footprint['features']} fit={fit_s:.2f}s")
+    return shards
+
+def build_index(docs: Optional[List[Tuple[str, str, float]]] = None):
+    global STORE, SHARDS, SHARD_BUCKETS, INDEX_VERSION
+    print("[INFO] Building index...")
+    buckets = max(1, INDEX_SHARDS)
+    pending: List[Tuple[str, str, float]] = []
+    with INDEX_LOCK:
+        _BUILD_WATCHERS.append(pending) # Ingests from now on are replayed into the new index
+    try:
+        corpus, meta = build_corpus(docs)
+        store = new_store()
+        store.extend(corpus, meta)
+        del corpus, meta # Only the compact store is kept
+        shards: List[IndexShard] = []
+        if not len(store):
+            print("[WARN] Corpus is empty. No text found in S3 to index.")
+        else:
+            shards = build_shards(store, buckets)
+            if shards:
+                print(f"[INFO] TF-IDF index built: {sum(len(s.rows) for s in shards)} rows in {len(shards)} shard(s)")
+        with INDEX_LOCK:
+            # Documents ingested while S3 was being read may not be in this listing yet
+            replay = [d for d in pending if store.file_id(d[0]) is None]
+            if replay:
+                try:
+                    shards, result, _ = _append_documents(store, shards, buckets, replay)
+                    print(f"[INFO] Replayed {result['ingested_files']} file(s) ingested during the rebuild")
+                except HTTPException as e:
+                    print(f"[WARN] Could not replay {len(replay)} file(s) ingested during the rebuild: {e.detail}")
+            old = SHARDS
+            STORE, SHARDS, SHARD_BUCKETS = store, shards, buckets
+            INDEX_VERSION += 1
+    finally:
+        with INDEX_LOCK:
+            _BUILD_WATCHERS[:] = [w for w in _BUILD_WATCHERS if w is not pending]
+    for shard in old:
+        shard.drop_cold()
+    retire_shards()
+
+def _ingest_target(shards: List[IndexShard], buckets: int, key: str) -> int:
+    """Shard id a new file belongs to; it may name a shard that does not exist yet."""
+    if INDEX_SHARD_BY == "hash":
+        return _shard_for_file(key, buckets) # Same bucket count as the build, not len(shards)
+    if not shards:
+        return 0
+    return max(shards, key=lambda sh: sh.ts_max).shard_id # New content belongs to the newest time range
+
+def _append_documents(store: CorpusStore, shards: List[IndexShard], buckets: int,
+                      docs: List[Tuple[str, str, float]]):
+    """
+    Chunk and vectorise docs into store/shards with the already fitted shared vocabulary (caller
+    holds INDEX_LOCK). Chunks whose shard does not exist (empty at build time) get a new shard on
+    the same vocabulary; with no shards at all, the vocabulary is fitted on the docs themselves.
+    Returns (shards, result, accepted docs); shards is a new list if one was created.
+    """
+    from scipy import sparse
+    new_docs = [d for d in docs if store.file_id(d[0]) is None and d[1].strip()]
+    skipped = len(docs) - len(new_docs)
+    corpus, meta = chunk_documents(new_docs)
+    if not corpus:
+        return shards, {"ingested_files": 0, "ingested_chunks": 0, "skipped_files": skipped}, []
+    by_id = {sh.shard_id: sh for sh in shards}
+    groups: Dict[int, List[int]] = {}
+    for local, m in enumerate(meta):
+        groups.setdefault(_ingest_target(shards, buckets, m["file"]), []).append(local)
+    first = None
+    if not shards:
+        # Nothing fitted yet; this is the first content, so fit the vocabulary on it directly
+        vectorizer, first, _ = _fit(corpus)
+        if first is None:
+            raise HTTPException(status_code=422, detail="Could not vectorise the ingested text.")
+        fit_id = next(_FIT_SEQ)
+    else:
+        vectorizer, fit_id = shards[0].vectorizer, shards[0].fit_id
+    start = len(store)
+    store.extend(corpus, meta) # Rows exist in the store before any shard points at them
+    new_rows = np.arange(start, start + len(corpus), dtype=np.int64)
+    eff_ts = _effective_ts(store.columns())[start:]
+    created = False
+    for shard_id, local in groups.items():
+        rows = first[local] if first is not None else vectorizer.transform([corpus[i] for i in local])
+        if shard_id not in by_id:
+            shard = IndexShard(shard_id, new_rows[local], vectorizer, rows, _ts_range(eff_ts[local]),
+                               _shard_footprint(vectorizer, rows, 0.0, shards[0].footprint if shards else None), fit_id)
+            if first is None:
+                shard.stale_rows = len(local)
+            by_id[shard_id], created = shard, True
+            continue
+        shard = by_id[shard_id]
+        if not shard.hot:
+            shard.load()
+        shard.matrix = sparse.vstack([shard.matrix, rows], format="csr")
+        shard.rows = np.concatenate([shard.rows, new_rows[local]])
+        lo, hi = _ts_range(eff_ts[local])
+        shard.ts_min, shard.ts_max = min(shard.ts_min, lo), max(shard.ts_max, hi)
+        shard.stale_rows += len(local)
+        shard.drop_cold() # The pickle lacks the new rows; retire_shards must dump the matrix again
+    if created:
+        shards = sorted(by_id.values(), key=lambda sh: sh.shard_id)
+    return shards, {"ingested_files": len(new_docs), "ingested_chunks": len(corpus), "skipped_files": skipped}, new_docs
+
+def ingest_documents(docs: List[Tuple[str, str, float]]) -> Dict[str, Any]:
+    """
+    Append new documents to the live index using the already fitted vocabularies (no refit).
+    Keys that are already indexed are skipped. IDF drift is corrected by refit_index().
+    """
+    global SHARDS, INDEX_VERSION
+    with INDEX_LOCK:
+        SHARDS, result, accepted = _append_documents(STORE, SHARDS, SHARD_BUCKETS, docs)
+        if accepted:
+            for pending in _BUILD_WATCHERS:
+                pending.extend(accepted)
+            INDEX_VERSION += 1
+            print(f"[INFO] Ingested {result['ingested_files']} files ({result['ingested_chunks']} chunks); "
+                  f"index now {len(STORE)} chunks")
+        return result
+
+def refit_index():
+    """Refit the shared vocabulary over the in-memory corpus to correct IDF drift from ingests."""
+    global INDEX_VERSION
+    from scipy import sparse
+    with INDEX_LOCK:
+        if not any(shard.stale_rows for shard in SHARDS):
+            return False
+        parts = [(shard, shard.rows) for shard in SHARDS]
+        store = STORE
+    # Outside the lock so /ask and /ingest keep going
+    vectorizer, matrices, fit_s = _fit_parts(store, [rows for _, rows in parts])
+    if vectorizer is None:
+        return False
+    fitted = {id(shard): (rows, matrix) for (shard, rows), matrix in zip(parts, matrices)}
+    fit_id = next(_FIT_SEQ)
+    shared = _shard_footprint(vectorizer, matrices[0], fit_s)
+    with INDEX_LOCK:
+        if STORE is not store:
+            return False # A rebuild replaced the index during the fit
+        for shard in SHARDS:
+            rows, matrix = fitted.get(id(shard), (shard.rows[:0], None))
+            extra = shard.rows[len(rows):] # Catch up with ingests that happened during the fit
+            if len(extra):
+                added = vectorizer.transform(store.texts(extra))
+                matrix = added if matrix is None else sparse.vstack([matrix, added], format="csr")
+            shard.vectorizer, shard.matrix, shard.fit_id = vectorizer, matrix, fit_id
+            shard.footprint = _shard_footprint(vectorizer, matrix, fit_s, shared)
+            shard.stale_rows = 0
+            shard.drop_cold()
+        INDEX_VERSION += 1
+    print(f"[INFO] Refit {len(parts)} shard(s) on one vocabulary in {fit_s:.2f}s")
+    retire_shards()
+    return True
+
+def retire_shards() -> int:
+    """Move shards older than INDEX_SHARD_RETENTION_DAYS to disk; they cold-load on demand."""
+    global INDEX_VERSION
+    if INDEX_SHARD_RETENTION_DAYS <= 0:
+        return 0
+    cutoff = time.time() - INDEX_SHARD_RETENTION_DAYS * 86400
+    with INDEX_LOCK:
+        candidates = [(sh, sh.matrix) for sh in SHARDS if sh.hot and sh.ts_max < cutoff]
+    retired = 0
+    for shard, matrix in candidates:
+        os.makedirs(INDEX_COLD_DIR, exist_ok=True)
+        path = shard.cold_path or os.path.join(INDEX_COLD_DIR, f"shard_{shard.shard_id}_{uuid.uuid4().hex[:8]}.pkl")
+        if not shard.cold_path:
+            with open(path, "wb") as f:
+                pickle.dump(matrix, f, protocol=pickle.HIGHEST_PROTOCOL)
+        with INDEX_LOCK:
+            if shard.matrix is not matrix: # Changed by an ingest/refit while pickling
+                if path != shard.cold_path:
+                    os.remove(path)
+                continue
+            shard.cold_path = path
+            shard.matrix = None # The shared vectorizer stays in memory
+            INDEX_VERSION += 1 # Queries without since/until no longer read this shard
+            retired += 1
+    if retired:
+        print(f"[INFO] Retired {retired} index shard(s) older than {INDEX_SHARD_RETENTION_DAYS} days to {INDEX_COLD_DIR}")
+    return retired
+
+def _refit_loop():
+    while True:
+        time.sleep(INDEX_REFIT_INTERVAL)
+        try:
+            refit_index()
+            retire_shards()
+        except Exception as e:
+            print(f"[ERROR] Background refit failed: {type(e).__name__}: {e}")
+
+def filter_mask(store: CorpusStore, cols: Dict[str, Any], filters: Optional["SearchFilters"]):
+    """Boolean row mask for the metadata filters, or None when nothing is filtered."""
+    if filters is None or not len(cols["prefix"]):
+        return None
+    n = len(cols["prefix"])
+    mask = np.ones(n, dtype=bool)
+    if filters.prefixes:
+        ids = [store.prefix_id(p) for p in filters.prefixes if store.prefix_id(p) is not None]
+        mask &= np.isin(cols["prefix"], ids)
+    if filters.sources:
+        codes = [SOURCE_TYPES.index(src) for src in filters.sources if src in SOURCE_TYPES]
+        mask &= np.isin(cols["source"], codes)
+    # NaN timestamps fail every comparison, so keys without a parsable time drop out of time-range queries
+    if filters.since is not None:
+        mask &= cols["ts"] >= filters.since.timestamp()
+    if filters.until is not None:
+        mask &= cols["ts"] <= filters.until.timestamp()
+    if filters.modified_since is not None:
+        mask &= cols["last_modified"] >= filters.modified_since.timestamp()
+    if filters.modified_until is not None:
+        mask &= cols["last_modified"] <= filters.modified_until.timestamp()
+    return mask
+
+# ========= QUERY-SIDE CACHES =========
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))             # top-k results, 0 disables
+QUERY_VECTOR_CACHE_SIZE = int(os.getenv("QUERY_VECTOR_CACHE_SIZE", "4096")) # per-shard query vectors, 0 disables
+
+class LRUCache:
+    """Small thread-safe LRU with hit/miss counters, tagged with the index version it is valid for."""
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self.version = None
+        self._items: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        self.miss_seconds = 0.0 # Time spent computing misses (to estimate time saved by hits)
+
+    def get(self, key, version):
+        with self._lock:
+            if version != self.version: # Index changed: everything cached is stale
+                self._items.clear()
+                self.version = version
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, version, seconds: float = 0.0):
+        with self._lock:
+            self.miss_seconds += seconds
+            if version != self.version or self.max_items <= 0:
+                return
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            avg_miss = self.miss_seconds / self.misses if self.misses else 0.0
+            return {"size": len(self._items), "max_items": self.max_items, "hits": self.hits,
+                    "misses": self.misses, "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                    "avg_miss_ms": round(avg_miss * 1000, 3),
+                    "est_time_saved_ms": round(self.hits * avg_miss * 1000, 1)}
+
+SEARCH_CACHE = LRUCache(SEARCH_CACHE_SIZE)
+QUERY_VECTOR_CACHE = LRUCache(QUERY_VECTOR_CACHE_SIZE)
+
+def normalize_query(query: str) -> str:
+    # The char analyzers lowercase anyway; collapsing whitespace lets near-identical queries share entries
+    return " ".join(query.lower().split())
+
+def _query_vector(vectorizer, fit_id: int, query: str):
+    """Query vectors depend only on the fitted vectorizer, so they survive ingests and filter changes."""
+    key = (query, fit_id)
+    qv = QUERY_VECTOR_CACHE.get(key, 0)
+    if qv is None:
+        t0 = time.perf_counter()
+        qv = vectorizer.transform([query])
+        QUERY_VECTOR_CACHE.put(key, qv, 0, time.perf_counter() - t0)
+    return qv
+
+def _search_shard(vectorizer, fit_id, matrix, rows, query: str, top_k: int, mask):
+    """Top-k (score, global row id) within one shard."""
+    if mask is not None:
+        local = np.flatnonzero(mask[rows])
+        if local.size == 0:
+            return []
+        # Score only the selected rows
+        matrix, rows = matrix[local], rows[local]
+    qv = _query_vector(vectorizer, fit_id, query)
+    # Rows and query are L2-normalised by the vectorizer, so a sparse dot product is the cosine
+    sims = np.asarray((matrix @ qv.T).todense()).ravel()
+    k = min(top_k, sims.size)
+    top = np.argpartition(-sims, k - 1)[:k]
+    return [(float(sims[i]), int(rows[i])) for i in top if sims[i] > 0.01]
+
+def search(query: str, top_k=5, filters: Optional["SearchFilters"] = None):
+    """Cached front for _search: repeated queries skip vectorising and scoring entirely."""
+    query = normalize_query(query)
+    version = INDEX_VERSION
+    key = (query, top_k, repr(filters))
+    cached = SEARCH_CACHE.get(key, version)
+    if cached is not None:
+        return list(cached)
+    t0 = time.perf_counter()
+    results = _search(query, top_k, filters)
+    if index_ready():
+        SEARCH_CACHE.put(key, tuple(results), version, time.perf_counter() - t0)
+    return results
+
+def skipped_shards(filters: Optional["SearchFilters"] = None) -> List[int]:
+    """Ids of retired shards a search with these filters does not read (no since/until given)."""
+    if filters is not None and (filters.since is not None or filters.until is not None):
+        return []
+    with INDEX_LOCK:
+        return [sh.shard_id for sh in SHARDS if not sh.hot]
+
+def _search_pool() -> ThreadPoolExecutor:
+    """Shared scatter-gather pool, created once even when the first searches race."""
+    global _SEARCH_POOL
+    with _SEARCH_POOL_LOCK:
+        if _SEARCH_POOL is None:
+            _SEARCH_POOL = ThreadPoolExecutor(max_workers=max(2, INDEX_SHARDS), thread_name_prefix="shard-search")
+        return _SEARCH_POOL
+
+def _search(query: str, top_k=5, filters: Optional["SearchFilters"] = None):
+    global INDEX_VERSION
+    lo = filters.since.timestamp() if filters is not None and filters.since is not None else None
+    hi = filters.until.timestamp() if filters is not None and filters.until is not None else None
+    with INDEX_LOCK:
+        store = STORE
+        cols = store.columns()
+        targets = []
+        for shard in SHARDS:
+            if not shard.overlaps(lo, hi):
+                continue # Time-range pruning
+            if not shard.hot:
+                if lo is None and hi is None:
+                    continue # Retired shards only serve explicit time-range queries
+                shard.load()
+                INDEX_VERSION += 1 # Hot again: queries without since/until read it from now on
+            targets.append((shard.vectorizer, shard.fit_id, shard.matrix, shard.rows))
+    if not SHARDS:
         print("[WARN] Search attempted but index is not built or empty.")
         return []
     try:
-        qv = VECTORIZER.transform([query])
-        sims = cosine_similarity(qv, MATRIX)[0]
-        order = np.argsort(-sims)
-        results = [(float(sims[i]), int(i)) for i in order[:top_k] if sims[i] > 0.01]
+        mask = filter_mask(store, cols, filters)
+        if len(targets) <= 1:
+            partials = [_search_shard(*t, query, top_k, mask) for t in targets]
+        else:
+            partials = list(_search_pool().map(lambda t: _search_shard(*t, query, top_k, mask), targets))
+        results = heapq.nlargest(top_k, (hit for part in partials for hit in part), key=lambda hit: hit[0])
         # print(f"[DEBUG] Search hits for '{query[:20]}...': {results}")
         return results
     except Exception as e:
@@ -196,62 +787,158 @@ def search(query: str, top_k=5):
 # ================================
 # Bedrock Call Function (English Response Requested)
 # ================================
-def call_bedrock_strict_answer(question: str, passages: List[str]) -> str:
+# Stable parts of the prompt. Kept byte-identical across requests so the
+# cached prefix can be reused by Bedrock prompt caching.
+SYSTEM_PROMPT = (
+    "You are a careful assistant. "
+    "Answer ONLY using the provided context. "
+    "If the answer cannot be found in the context, respond with exactly: <NO_ANSWER>. "
+    "Keep the answer concise and precise, **in English.**"
+)
+INSTRUCTIONS = (
+    "Requirements:\n"
+    "1) Answer using only the context provided;\n"
+    "2) Be brief and precise;\n"
+    "3) If the context does not contain the relevant information, output only: <NO_ANSWER>\n"
+)
+MAX_CONTEXT_CHARS = 10000 # Rough character limit
+
+STATS_LOCK = threading.Lock()
+
+# Cached vs uncached input token counters (from the Bedrock "usage" block)
+PROMPT_CACHE_STATS: Dict[str, int] = {
+    "requests": 0,
+    "cached_requests": 0,
+    "input_tokens": 0,
+    "cache_read_input_tokens": 0,
+    "cache_creation_input_tokens": 0,
+    "output_tokens": 0,
+    "below_min_tokens": 0, # Requests whose prefix was too short to mark cacheable
+}
+
+def supports_prompt_cache(model_id: str) -> bool:
+    return PROMPT_CACHE_ENABLED and any(m in model_id for m in PROMPT_CACHE_MODELS)
+
+def prompt_cache_min_tokens(model_id: str) -> int:
+    return next((n for m, n in PROMPT_CACHE_MIN_TOKENS.items() if m in model_id), 1024)
+
+def build_strict_answer_body(question: str, passages: List[str], model_id: str = LLM_MODEL_ID,
+                             max_tokens: int = MAX_TOKENS,
+                             history: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
     """
-    Call Claude via Bedrock.
-    The model must answer ONLY from the provided context; otherwise output <NO_ANSWER>.
-    **Requests response in English.**
+    Build the invoke_model body. Stable content goes first (system prompt with the
+    fixed instructions, then prior turns, then the context block), the question goes
+    last. When the model supports it, the stable blocks carry cache_control breakpoints, but only
+    where the prompt up to the breakpoint reaches the model's minimum cacheable length: a shorter
+    context breakpoint would never be read back and still pay the cache-write premium.
     """
-    if not passages:
-        print("[INFO] No passages provided to Bedrock.")
-        return "" # Don't call LLM if no context
-
     context = "\n\n---\n\n".join(passages)
-    max_context_len = 10000 # Rough character limit
-    if len(context) > max_context_len:
-        print(f"[WARN] Truncating context from {len(context)} to {max_context_len} chars for Bedrock.")
-        context = context[:max_context_len]
-
-    # --- MODIFIED: System Prompt for English ---
-    system_prompt = (
-        "You are a careful assistant. "
-        "Answer ONLY using the provided context. "
-        "If the answer cannot be found in the context, respond with exactly: <NO_ANSWER>. "
-        "Keep the answer concise and precise, **in English.**" # Changed language
-    )
-    # --- END MODIFICATION ---
+    if len(context) > MAX_CONTEXT_CHARS:
+        print(f"[WARN] Truncating context from {len(context)} to {MAX_CONTEXT_CHARS} chars for Bedrock.")
+        context = context[:MAX_CONTEXT_CHARS]
 
-    # --- MODIFIED: User Message in English ---
-    user_msg = (
-        f"Question:\n{question}\n\n"
-        f"Context (Only refer to this content):\n{context}\n\n"
-        "Requirements:\n"
-        "1) Answer using only the context provided;\n"
-        "2) Be brief and precise;\n"
-        "3) If the context does not contain the relevant information, output only: <NO_ANSWER>\n"
-    )
-    # --- END MODIFICATION ---
+    system_text = f"{SYSTEM_PROMPT}\n\n{INSTRUCTIONS}"
+    context_block = {"type": "text", "text": f"Context (Only refer to this content):\n{context}"}
+    question_block = {"type": "text", "text": f"Question:\n{question}"}
+
+    messages = history_messages(history or [])
+    system: Any = system_text # Plain path for models without prompt caching
+    if supports_prompt_cache(model_id):
+        min_tokens = prompt_cache_min_tokens(model_id)
+        prefix_tokens = estimate_tokens(system_text)
+        if prefix_tokens >= min_tokens:
+            system = [{"type": "text", "text": system_text, "cache_control": {"type": "ephemeral"}}]
+        prefix_tokens += sum(estimate_tokens(b["text"]) for m in messages for b in m["content"])
+        prefix_tokens += estimate_tokens(context_block["text"])
+        if prefix_tokens >= min_tokens:
+            context_block["cache_control"] = {"type": "ephemeral"}
+        else:
+            with STATS_LOCK:
+                PROMPT_CACHE_STATS["below_min_tokens"] += 1
 
-    body = {
+    return {
         "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": MAX_TOKENS,
+        "max_tokens": max_tokens,
         "temperature": 0.0, # Deterministic
-        "system": system_prompt,
-        "messages": [
-            {"role": "user", "content": [{"type": "text", "text": user_msg}]}
+        "system": system,
+        "messages": messages + [
+            {"role": "user", "content": [context_block, question_block]}
         ],
     }
 
+def record_usage(payload: Dict[str, Any]) -> Dict[str, int]:
+    """Accumulate cached/uncached input token counts from a Bedrock response."""
+    usage = payload.get("usage") or {}
+    counts = {k: int(usage.get(k) or 0) for k in (
+        "input_tokens", "cache_read_input_tokens", "cache_creation_input_tokens", "output_tokens")}
+    with STATS_LOCK:
+        PROMPT_CACHE_STATS["requests"] += 1
+        if counts["cache_read_input_tokens"]:
+            PROMPT_CACHE_STATS["cached_requests"] += 1
+        for k, v in counts.items():
+            PROMPT_CACHE_STATS[k] += v
+    print(f"[INFO] Bedrock usage: input={counts['input_tokens']} cache_read={counts['cache_read_input_tokens']} "
+          f"cache_write={counts['cache_creation_input_tokens']} output={counts['output_tokens']}")
+    return counts
+
+# Per-model call counters and routing decisions
+MODEL_STATS: Dict[str, Dict[str, float]] = {}
+ROUTER_STATS: Dict[str, int] = {"direct": 0, "fast": 0, "escalated_no_answer": 0, "skipped_low_margin": 0}
+
+def estimate_cost(model_id: str, usage: Dict[str, int]) -> float:
+    """USD cost of one call. Cache reads bill at 10% and cache writes at 125% of the input price."""
+    price_in, price_out = MODEL_PRICES.get(model_id, [0.0, 0.0])
+    input_units = (usage.get("input_tokens", 0)
+                   + 0.1 * usage.get("cache_read_input_tokens", 0)
+                   + 1.25 * usage.get("cache_creation_input_tokens", 0))
+    return (input_units * price_in + usage.get("output_tokens", 0) * price_out) / 1000.0
+
+def record_model_call(model_id: str, latency_s: float, usage: Dict[str, int]):
+    with STATS_LOCK:
+        st = MODEL_STATS.setdefault(model_id, {"calls": 0, "latency_ms_total": 0.0, "input_tokens": 0,
+                                               "output_tokens": 0, "cost_usd": 0.0})
+        st["calls"] += 1
+        st["latency_ms_total"] += latency_s * 1000.0
+        st["input_tokens"] += (usage.get("input_tokens", 0) + usage.get("cache_read_input_tokens", 0)
+                               + usage.get("cache_creation_input_tokens", 0))
+        st["output_tokens"] += usage.get("output_tokens", 0)
+        st["cost_usd"] += estimate_cost(model_id, usage)
+
+def call_bedrock_strict_answer(question: str, passages: List[str], model_id: str = LLM_MODEL_ID,
+                               max_tokens: int = MAX_TOKENS,
+                               history: Optional[List[Dict[str, str]]] = None) -> str:
+    """
+    Call Claude via Bedrock.
+    The model must answer ONLY from the provided context; otherwise output <NO_ANSWER>.
+    **Requests response in English.**
+    """
+    if not passages:
+        print("[INFO] No passages provided to Bedrock.")
+        return "" # Don't call LLM if no context
+
+    body = build_strict_answer_body(question, passages, model_id=model_id, max_tokens=max_tokens,
+                                    history=history)
+
+    from botocore.exceptions import ClientError # Lazy, like boto3 itself
     try:
         br = bedrock_runtime()
-        print(f"[INFO] Calling Bedrock model: {LLM_MODEL_ID} for question: '{question[:30]}...'")
-        resp = br.invoke_model(
-            modelId=LLM_MODEL_ID,
-            body=json.dumps(body).encode("utf-8"),
-            accept="application/json",
-            contentType="application/json",
+        print(f"[INFO] Calling Bedrock model: {model_id} for question: '{question[:30]}...'")
+        body_bytes = json.dumps(body).encode("utf-8")
+        t0 = time.perf_counter()
+        resp = get_scheduler().call(
+            lambda: br.invoke_model(
+                modelId=model_id,
+                body=body_bytes,
+                accept="application/json",
+                contentType="application/json",
+            ),
+            priority=PRIORITY_INTERACTIVE,
+            est_tokens=len(body_bytes) / 4 + max_tokens,
+            timeout=BEDROCK_ADMIT_TIMEOUT,
+            name=f"invoke_model({model_id})",
         )
         payload = json.loads(resp["body"].read().decode("utf-8"))
+        record_model_call(model_id, time.perf_counter() - t0, record_usage(payload))
 
         answer = ""
         content_blocks = payload.get("content", [])
@@ -267,19 +954,188 @@ def call_bedrock_strict_answer(question: str, passages: List[str]) -> str:
         if "<NO_ANSWER>" in answer or not answer:
             return ""
         return answer
-    except botocore.exceptions.ClientError as error:
+    except ClientError as error:
          error_code = error.response.get("Error", {}).get("Code")
          error_msg = error.response.get("Error", {}).get("Message")
          print(f"[ERROR] Bedrock ClientError: {error_code} - {error_msg}")
+         if is_throttle(error):
+             raise HTTPException(status_code=429, detail=f"Bedrock is throttling requests, please retry shortly: {error_msg}")
          if error_code == 'AccessDeniedException':
              print("[ERROR] Hint: Check IAM permissions for bedrock:InvokeModel and access to the specific model ID/ARN.")
          elif error_code == 'ValidationException':
              print("[ERROR] Hint: Check if the request body format is correct for the model or if the Model ID is valid/accessible.")
          raise HTTPException(status_code=500, detail=f"Bedrock API Error: {error_msg}")
+    except SchedulerTimeout as e:
+        print(f"[WARN] {e}")
+        raise HTTPException(status_code=503, detail="Bedrock request queue is full, please retry shortly.")
     except Exception as e:
         print(f"[ERROR] Bedrock invocation failed: {type(e).__name__}: {e}")
         raise HTTPException(status_code=500, detail="Bedrock invocation failed unexpectedly.")
 
+def _count_route(decision: str):
+    with STATS_LOCK:
+        ROUTER_STATS[decision] += 1
+
+def route_strict_answer(question: str, passages: List[str], scores: List[float],
+                        history: Optional[List[Dict[str, str]]] = None) -> str:
+    """
+    Router in front of call_bedrock_strict_answer.
+    Easy questions (high top score, short context) try ROUTER_FAST_MODEL_ID first; a low
+    retrieval margin skips straight to LLM_MODEL_ID, and <NO_ANSWER> from the fast model escalates.
+    """
+    if not ROUTER_FAST_MODEL_ID or ROUTER_FAST_MODEL_ID == LLM_MODEL_ID or not passages:
+        _count_route("direct")
+        return call_bedrock_strict_answer(question, passages, history=history)
+
+    top = scores[0] if scores else 0.0
+    margin = top - scores[1] if len(scores) > 1 else top
+    context_chars = sum(len(p) for p in passages)
+    easy = top >= ROUTER_MIN_TOP_SCORE and context_chars <= ROUTER_MAX_CONTEXT_CHARS
+    if not easy:
+        _count_route("direct")
+        return call_bedrock_strict_answer(question, passages, history=history)
+    if margin < ROUTER_MIN_MARGIN:
+        print(f"[INFO] Router: low retrieval margin ({margin:.3f}), using {LLM_MODEL_ID}")
+        _count_route("skipped_low_margin")
+        return call_bedrock_strict_answer(question, passages, history=history)
+
+    print(f"[INFO] Router: easy question (top={top:.3f}, margin={margin:.3f}, chars={context_chars}), "
+          f"trying {ROUTER_FAST_MODEL_ID}")
+    try:
+        answer = call_bedrock_strict_answer(question, passages, model_id=ROUTER_FAST_MODEL_ID,
+                                            max_tokens=ROUTER_FAST_MAX_TOKENS, history=history)
+    except HTTPException as http_exc:
+        print(f"[WARN] Router: fast model failed ({http_exc.detail}), escalating.")
+        answer = ""
+    if answer:
+        _count_route("fast")
+        return answer
+    print(f"[INFO] Router: no answer from fast model, escalating to {LLM_MODEL_ID}")
+    _count_route("escalated_no_answer")
+    return call_bedrock_strict_answer(question, passages, history=history)
+
+def routing_report() -> Dict[str, Any]:
+    with STATS_LOCK:
+        models = {
+            m: {**st, "avg_latency_ms": round(st["latency_ms_total"] / st["calls"], 1) if st["calls"] else 0.0,
+                "cost_usd": round(st["cost_usd"], 6)}
+            for m, st in MODEL_STATS.items()
+        }
+        return {"fast_model_id": ROUTER_FAST_MODEL_ID or None, "decisions": dict(ROUTER_STATS), "models": models}
+
+# ================================
+# Conversation Sessions
+# ================================
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "20"))
+SESSION_MEMORY_BYTES = int(os.getenv("SESSION_MEMORY_BYTES", str(32 * 1024 * 1024)))
+SESSION_HISTORY_TOKENS = int(os.getenv("SESSION_HISTORY_TOKENS", "1500")) # Prior turns sent to the model
+
+class SessionStore:
+    """Bounded per-session Q/A history: LRU-evicted by session count and total bytes."""
+
+    def __init__(self, max_sessions: int, max_turns: int, max_bytes: int):
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, List[Dict[str, str]]]" = OrderedDict()
+        self._bytes = 0
+        self._evicted = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(turn: Dict[str, str]) -> int:
+        return len(turn["question"].encode("utf-8")) + len(turn["answer"].encode("utf-8"))
+
+    def get(self, session_id: str) -> List[Dict[str, str]]:
+        with self._lock:
+            turns = self._sessions.get(session_id)
+            if turns is None:
+                return []
+            self._sessions.move_to_end(session_id)
+            return list(turns)
+
+    def append(self, session_id: str, question: str, answer: str):
+        turn = {"question": question, "answer": answer}
+        with self._lock:
+            turns = self._sessions.setdefault(session_id, [])
+            self._sessions.move_to_end(session_id)
+            turns.append(turn)
+            self._bytes += self._size(turn)
+            while len(turns) > self.max_turns:
+                self._bytes -= self._size(turns.pop(0))
+            while self._sessions and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+                _, old = self._sessions.popitem(last=False)
+                self._bytes -= sum(self._size(t) for t in old)
+                self._evicted += 1
+
+    def drop(self, session_id: str) -> bool:
+        with self._lock:
+            turns = self._sessions.pop(session_id, None)
+            if turns is None:
+                return False
+            self._bytes -= sum(self._size(t) for t in turns)
+            return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"sessions": len(self._sessions), "bytes": self._bytes, "evicted": self._evicted}
+
+SESSIONS = SessionStore(SESSION_MAX_SESSIONS, SESSION_MAX_TURNS, SESSION_MEMORY_BYTES)
+
+# Follow-up cues: a leading connective, or a pronoun standing in for something said earlier
+_FOLLOWUP_RE = re.compile(
+    r"^(and|also|but|so|what about|how about|then)\b|\b(it|its|they|them|their|those|these|he|she|him|her)\b",
+    re.IGNORECASE,
+)
+_DEMONSTRATIVE_RE = re.compile(r"\b(this|that|there)\b", re.IGNORECASE)
+_WORD_RE = re.compile(r"[a-z0-9]+")
+# Words that carry no topic of their own (question words, auxiliaries, pronouns, fillers)
+_FOLLOWUP_STOPWORDS = set("""
+a an the and also but so then what about how why when where who whom which whose is are was were be been
+being do does did done have has had can could would should will shall may might must it its this that these those
+they them their there he she him her his i me my we us our you your of in on at to for from with by as
+tell more show explain say said mean happened happen else any some same one ones again please
+""".split())
+FOLLOWUP_SHORT_WORDS = 6 # Cued questions up to this many words are treated as follow-ups
+
+def rewrite_followup(question: str, history: List[Dict[str, str]]) -> str:
+    """
+    Turn a follow-up into a standalone retrieval query by prepending the previous question.
+    Only questions with a follow-up cue (leading "and"/"what about", or a pronoun such as "it")
+    are rewritten, and only when they are short or bring no content words of their own
+    ("what about it?", "and who sent them?"). Standalone questions are left alone.
+    """
+    if not history:
+        return question
+    words = _WORD_RE.findall(question.lower())
+    content = [w for w in words if w not in _FOLLOWUP_STOPWORDS and len(w) > 2]
+    cued = bool(_FOLLOWUP_RE.search(question)) or (not content and bool(_DEMONSTRATIVE_RE.search(question)))
+    if not cued or (len(words) > FOLLOWUP_SHORT_WORDS and content):
+        return question
+    return f"{history[-1]['question']} {question}"
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+def history_window(history: List[Dict[str, str]], budget_tokens: int = SESSION_HISTORY_TOKENS) -> List[Dict[str, str]]:
+    """Newest turns that fit in the token budget, oldest first."""
+    window, used = [], 0
+    for turn in reversed(history):
+        cost = estimate_tokens(turn["question"]) + estimate_tokens(turn["answer"])
+        if used + cost > budget_tokens:
+            break
+        window.append(turn)
+        used += cost
+    return window[::-1]
+
+def history_messages(history: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    messages = []
+    for turn in history:
+        messages.append({"role": "user", "content": [{"type": "text", "text": turn["question"]}]})
+        messages.append({"role": "assistant", "content": [{"type": "text", "text": turn["answer"]}]})
+    return messages
+
 # ================================
 # FastAPI Application Setup
 # ================================
@@ -293,9 +1149,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class SearchFilters(BaseModel):
+    prefixes: Optional[List[str]] = None # Any of TXT_PREFIXES, e.g. "screenshots/"
+    sources: Optional[List[str]] = None  # "screenshot", "transcript", "other"
+    since: Optional[datetime] = None     # Capture time parsed from the key
+    until: Optional[datetime] = None
+    modified_since: Optional[datetime] = None # S3 LastModified
+    modified_until: Optional[datetime] = None
+
 class AskReq(BaseModel):
     question: str
     top_k: int = 5
+    session_id: Optional[str] = None # Omit to start a new session
+    filters: Optional[SearchFilters] = None
 
 class Passage(BaseModel):
     file: str
@@ -306,18 +1172,80 @@ class Passage(BaseModel):
 class AskResp(BaseModel):
     answer: str
     passages: List[Passage]
+    session_id: Optional[str] = None
+    skipped_shards: List[int] = [] # Retired shards not searched; pass since/until to include them
+
+class IngestDoc(BaseModel):
+    key: str
+    text: str
+
+class IngestReq(BaseModel):
+    documents: List[IngestDoc]
+
+class AdmitReq(BaseModel):
+    priority: int = PRIORITY_BACKGROUND
+    est_tokens: float = 1000
+    timeout: Optional[float] = None
+    throttled: bool = False # Report a throttled call instead of asking for admission
+
+# The first index build runs in the background so /livez and /health answer while S3 is read.
+INDEX_BUILT = threading.Event() # Set once an index build has completed
+STARTUP: Dict[str, Any] = {"state": "starting", "import_s": None, "index_build_s": None, "ready_s": None, "error": None}
+
+def _mark_built(build_s: float):
+    STARTUP["state"], STARTUP["error"] = "ready", None
+    STARTUP["index_build_s"] = round(build_s, 3)
+    if STARTUP["ready_s"] is None:
+        STARTUP["ready_s"] = round(time.time() - PROCESS_START, 3)
+    INDEX_BUILT.set()
+
+def _initial_build():
+    t0 = time.time()
+    try:
+        build_index()
+        _mark_built(time.time() - t0)
+        print(f"[INFO] Ready {STARTUP['ready_s']}s after start (index build {STARTUP['index_build_s']}s)")
+    except Exception as e:
+        # Stay unready; POST /reload retries the build
+        STARTUP["state"], STARTUP["error"] = "build_failed", f"{type(e).__name__}: {e}"
+        print(f"[ERROR] Initial index build failed: {STARTUP['error']}")
+    if INDEX_REFIT_INTERVAL > 0:
+        threading.Thread(target=_refit_loop, daemon=True, name="index-refit").start()
 
 @app.on_event("startup")
 def _startup():
-    print("[INFO] Server starting up, building initial index...")
-    build_index()
+    STARTUP["import_s"] = round(time.time() - PROCESS_START, 3) # Module import + app setup
+    print(f"[INFO] Server starting up ({STARTUP['import_s']}s to import), building initial index in the background...")
+    threading.Thread(target=_initial_build, daemon=True, name="index-build").start()
+
+@app.get("/livez")
+def livez():
+    """Liveness: the process is up and serving requests."""
+    return {"ok": True}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: 503 until the first index build has finished."""
+    if not INDEX_BUILT.is_set():
+        raise HTTPException(status_code=503, detail=f"Index {STARTUP['state']}")
+    return {"ok": True, "index_ready": index_ready(), "indexed_chunks": len(STORE)}
 
 @app.get("/health")
 def health():
-    status = {"ok": True, "indexed_chunks": len(CORPUS), "index_ready": MATRIX is not None}
-    if MATRIX is not None:
-        status["index_shape"] = MATRIX.shape
+    shards = list(SHARDS)
+    status = {"ok": True, "indexed_chunks": len(STORE), "index_ready": index_ready(),
+              "index_version": INDEX_VERSION, "ingested_since_fit": sum(sh.stale_rows for sh in shards)}
+    if shards:
+        status["index_shards"] = [sh.describe() for sh in shards]
+        status["retired_shards"] = [sh.shard_id for sh in shards if not sh.hot] # Skipped without since/until
+    status["corpus_store"] = STORE.stats() # Includes bytes_per_chunk
+    status["search_cache"] = {"results": SEARCH_CACHE.stats(), "query_vectors": QUERY_VECTOR_CACHE.stats()}
     status["model_id"] = LLM_MODEL_ID
+    status["prompt_cache"] = {"enabled": supports_prompt_cache(LLM_MODEL_ID), **PROMPT_CACHE_STATS}
+    status["routing"] = routing_report()
+    status["bedrock_scheduler"] = get_scheduler().stats()
+    status["sessions"] = SESSIONS.stats()
+    status["startup"] = {**STARTUP, "uptime_s": round(time.time() - PROCESS_START, 1)}
     # Add check for script process
     status["listener_running"] = screenshot_process is not None and screenshot_process.poll() is None
     if status["listener_running"] and screenshot_process:
@@ -327,8 +1255,42 @@ def health():
 @app.post("/reload")
 def reload_index():
     print("[INFO] Reloading index via API call...")
+    t0 = time.time()
     build_index()
-    return {"ok": True, "indexed_chunks": len(CORPUS), "index_ready": MATRIX is not None}
+    _mark_built(time.time() - t0)
+    return {"ok": True, "indexed_chunks": len(STORE), "index_ready": index_ready()}
+
+@app.post("/ingest")
+def ingest(req: IngestReq):
+    """Chunk and vectorise new documents into the live index (no S3 re-read, no refit)."""
+    if not req.documents:
+        raise HTTPException(status_code=400, detail="No documents provided")
+    now = time.time()
+    result = ingest_documents([(d.key, d.text, now) for d in req.documents])
+    return {"ok": True, **result, "indexed_chunks": len(STORE), "index_version": INDEX_VERSION}
+
+@app.post("/scheduler/admit")
+def scheduler_admit(req: AdmitReq):
+    """
+    Admission for Bedrock calls made by other processes (screenshot_upload.py), so they share
+    this server's buckets and queue behind interactive /ask calls. Returns once the call may start.
+    """
+    scheduler = get_scheduler()
+    if req.throttled:
+        scheduler.note_throttle()
+        return {"ok": True}
+    # Remote callers are background work; they never jump ahead of /ask
+    priority = max(req.priority, PRIORITY_BACKGROUND)
+    try:
+        scheduler.admit(priority, req.est_tokens, req.timeout)
+    except SchedulerTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"ok": True}
+
+@app.post("/refit")
+def refit():
+    """Force an IDF refit over the in-memory corpus."""
+    return {"ok": True, "refit": refit_index(), "index_version": INDEX_VERSION}
 
 @app.post("/ask", response_model=AskResp)
 def ask(req: AskReq):
@@ -337,40 +1299,57 @@ def ask(req: AskReq):
         raise HTTPException(status_code=400, detail="Question cannot be empty")
 
     print(f"[INFO] Received question for /ask: '{q}'")
-    if MATRIX is None:
+    # Ingests can add shards before the first build finishes; answer only once it has
+    if not INDEX_BUILT.is_set():
          print("[WARN] Index not ready, cannot process question.")
          raise HTTPException(status_code=503, detail="Index is not ready. Please wait or reload.")
 
-    hits = search(q, top_k=max(1, min(req.top_k, 20)))
+    session_id = req.session_id or uuid.uuid4().hex
+    history = SESSIONS.get(session_id)
+    retrieval_query = rewrite_followup(q, history)
+    if retrieval_query != q:
+        print(f"[INFO] Follow-up rewritten for retrieval: '{retrieval_query[:80]}'")
+
+    hits = search(retrieval_query, top_k=max(1, min(req.top_k, 20)), filters=req.filters)
+    skipped = skipped_shards(req.filters)
+    if skipped:
+        print(f"[INFO] Retired shard(s) {skipped} not searched (no since/until in the request)")
 
     passages_response = []
     llm_answer = "" # Initialize
 
     if hits:
+        store = STORE
+        # Only the returned passages are decoded from the store
         passages_response = [
             Passage(
-                file=META[idx]["file"],
-                chunk_id=META[idx]["chunk_id"],
+                file=store.file(idx),
+                chunk_id=store.chunk_id(idx),
                 score=round(score, 6),
-                text=CORPUS[idx],
+                text=store.text(idx),
             )
-            for score, idx in hits if idx < len(CORPUS) # Safety check
+            for score, idx in hits if idx < len(store) # Safety check
         ]
         top_context_texts = [p.text for p in passages_response[:3]]
         try:
              # This now raises HTTPException on Bedrock errors
-             llm_answer = call_bedrock_strict_answer(q, top_context_texts)
+             llm_answer = route_strict_answer(q, top_context_texts, [score for score, _ in hits],
+                                              history=history_window(history))
         except HTTPException as http_exc:
+             if http_exc.status_code in (429, 503):
+                 raise # Throttling / admission timeout: let the client see the status and retry
              # Forward the Bedrock error details from call_bedrock_strict_answer
              print(f"[ERROR] Bedrock call failed within /ask: {http_exc.detail}")
              final_answer = f"Error generating AI response: {http_exc.detail}"
              # Still return passages found, but indicate the answer generation failed
-             return AskResp(answer=final_answer, passages=passages_response)
+             return AskResp(answer=final_answer, passages=passages_response, session_id=session_id,
+                            skipped_shards=skipped)
         except Exception as e:
              # Catch unexpected errors during the call
              print(f"[ERROR] Unexpected error during Bedrock call in /ask: {e}")
              final_answer = f"Unexpected error generating AI response."
-             return AskResp(answer=final_answer, passages=passages_response)
+             return AskResp(answer=final_answer, passages=passages_response, session_id=session_id,
+                            skipped_shards=skipped)
 
     else:
         print("[INFO] No relevant passages found by search for this question.")
@@ -384,7 +1363,14 @@ def ask(req: AskReq):
         final_answer = llm_answer
     # --- END MODIFICATION ---
 
-    return AskResp(answer=final_answer, passages=passages_response)
+    SESSIONS.append(session_id, q, final_answer)
+    return AskResp(answer=final_answer, passages=passages_response, session_id=session_id,
+                   skipped_shards=skipped)
+
+@app.delete("/session/{session_id}")
+def end_session(session_id: str):
+    """Forget a conversation's history."""
+    return {"ok": True, "dropped": SESSIONS.drop(session_id)}
 
 
 # ================================
@@ -0,0 +1,109 @@
+# Admission, token-bucket and retry tests for bedrock_scheduler.BedrockScheduler (local buckets only).
+
+import threading
+import time
+
+import pytest
+
+from bedrock_scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, BedrockScheduler, SchedulerTimeout
+
+
+class FakeThrottle(Exception):
+    """Shaped like a botocore ClientError for a throttled call."""
+
+    def __init__(self, code="ThrottlingException"):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def test_interactive_is_admitted_before_queued_background():
+    sched = BedrockScheduler(rpm=120, tpm=1e9) # One request token every 0.5s
+    sched.requests.tokens = 0.0
+    order, lock = [], threading.Lock()
+
+    def run(name, priority):
+        sched.admit(priority, est_tokens=1, timeout=5)
+        with lock:
+            order.append(name)
+
+    threads = [threading.Thread(target=run, args=(f"bg{i}", PRIORITY_BACKGROUND)) for i in range(2)]
+    for t in threads:
+        t.start()
+    _wait_for(lambda: sched.stats()["queue_depth"] == 2)
+    late = threading.Thread(target=run, args=("ask", PRIORITY_INTERACTIVE))
+    late.start()
+    threads.append(late)
+    for t in threads:
+        t.join()
+    assert order[0] == "ask"
+    assert sorted(order[1:]) == ["bg0", "bg1"]
+    stats = sched.stats()
+    assert stats["admitted"] == 3 and stats["queue_depth"] == 0 and stats["max_queue_depth"] == 3
+
+
+def test_token_bucket_waits_for_refill():
+    sched = BedrockScheduler(rpm=1e6, tpm=600) # 10 tokens per second
+    t0 = time.monotonic()
+    sched.admit(est_tokens=600) # Drains the bucket
+    sched.admit(est_tokens=5)   # Needs half a second of refill
+    assert time.monotonic() - t0 >= 0.4
+    assert sched.stats()["admitted"] == 2
+
+    fresh = BedrockScheduler(rpm=1e6, tpm=600)
+    fresh.admit(est_tokens=10 ** 6, timeout=0.5) # Oversized calls are clamped to the bucket size
+    assert fresh.stats()["admitted"] == 1
+
+
+def test_timed_out_entry_leaves_the_queue():
+    sched = BedrockScheduler(rpm=6, tpm=1e9) # One request token every 10s
+    sched.requests.tokens = 0.0
+    with pytest.raises(SchedulerTimeout):
+        sched.admit(PRIORITY_BACKGROUND, timeout=0.1)
+    stats = sched.stats()
+    assert stats["timeouts"] == 1 and stats["queue_depth"] == 0 and stats["admitted"] == 0
+    sched.requests.tokens = 1.0 # The next caller is not stuck behind the dead entry
+    sched.admit(PRIORITY_BACKGROUND, timeout=0.5)
+    assert sched.stats()["admitted"] == 1
+
+
+def test_gives_up_after_max_retries():
+    sched = BedrockScheduler(rpm=6000, tpm=1e9, max_retries=2, backoff_base=0.0)
+    calls = []
+
+    def always_throttled():
+        calls.append(1)
+        raise FakeThrottle()
+
+    with pytest.raises(FakeThrottle):
+        sched.call(always_throttled, timeout=5)
+    assert len(calls) == 3
+    stats = sched.stats()
+    assert stats["throttles"] == 3 and stats["retries"] == 2 and stats["gave_up"] == 1
+
+
+def test_retries_then_succeeds_and_other_errors_are_not_retried():
+    sched = BedrockScheduler(rpm=6000, tpm=1e9, max_retries=2, backoff_base=0.0)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise FakeThrottle("ServiceUnavailableException")
+        return "ok"
+
+    assert sched.call(flaky, timeout=5) == "ok"
+    assert sched.stats()["retries"] == 2 and sched.stats()["gave_up"] == 0
+
+    def broken():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        sched.call(broken, timeout=5)
+    assert sched.stats()["retries"] == 2 and sched.stats()["admitted"] == 4
@@ -0,0 +1,108 @@
+# Round-trip tests for corpus_store.CorpusStore, the only source of passage text for /ask.
+
+import math
+import threading
+
+import numpy as np
+import pytest
+
+import corpus_store
+from corpus_store import CorpusStore
+
+COMPRESSIONS = [None, pytest.param("zstd", marks=pytest.mark.skipif(corpus_store.zstandard is None,
+                                                                     reason="zstandard not installed"))]
+
+
+def _chunk(i):
+    # Varying lengths and non-ASCII text so byte offsets differ from character offsets
+    return f"chunk {i} " + "é漢" * (i % 7) + "x" * (i % 13)
+
+
+def _meta(i):
+    return {"file": f"screenshots/analysis_{i // 3}.txt", "chunk_id": i % 3, "prefix": f"p{i % 4}/",
+            "source": corpus_store.SOURCE_TYPES[i % 3], "ts": None if i % 5 == 0 else 1000.0 + i,
+            "last_modified": 2000.0 + i}
+
+
+def _fill(store, start, stop, batch=50):
+    for lo in range(start, stop, batch):
+        rows = range(lo, min(stop, lo + batch))
+        store.extend([_chunk(i) for i in rows], [_meta(i) for i in rows])
+
+
+def _check_row(store, i):
+    assert store.text(i) == _chunk(i)
+    assert store.file(i) == _meta(i)["file"]
+    assert store.chunk_id(i) == _meta(i)["chunk_id"]
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_round_trip_across_blocks_and_growth(compression):
+    store = CorpusStore(compression=compression, block_size=16, cache_blocks=2)
+    n = 2500 # Past the initial 1024-row capacity twice, and ends inside an open (unsealed) block
+    _fill(store, 0, n)
+    assert len(store) == n
+    for i in range(n):
+        _check_row(store, i)
+    # Random access evicts and re-decodes blocks through the small cache
+    for i in np.random.default_rng(0).integers(0, n, 300):
+        _check_row(store, int(i))
+    assert store.texts([0, 15, 16, 17, n - 1]) == [_chunk(i) for i in (0, 15, 16, 17, n - 1)]
+
+    cols = store.columns()
+    assert all(len(col) == n for col in cols.values())
+    for i in (0, 5, 1023, 1024, 2047, 2048, n - 1):
+        m = _meta(i)
+        assert store.files[cols["file_id"][i]] == m["file"]
+        assert store.prefixes[cols["prefix"][i]] == m["prefix"]
+        assert corpus_store.SOURCE_TYPES[cols["source"][i]] == m["source"]
+        assert math.isnan(cols["ts"][i]) if m["ts"] is None else cols["ts"][i] == m["ts"]
+        assert cols["last_modified"][i] == m["last_modified"]
+    assert store.file_id("screenshots/analysis_0.txt") == 0
+    assert store.file_id("missing.txt") is None
+    assert store.stats()["compression"] == (compression or "none")
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_block_boundaries(compression):
+    store = CorpusStore(compression=compression, block_size=4)
+    _fill(store, 0, 4, batch=4) # Exactly one sealed block, empty open buffer
+    for i in range(4):
+        _check_row(store, i)
+    _fill(store, 4, 5, batch=1) # First row of the next (open) block
+    for i in range(5):
+        _check_row(store, i)
+    if compression:
+        assert len(store._sealed) == 1
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_reads_while_blocks_are_sealed(compression):
+    store = CorpusStore(compression=compression, block_size=8, cache_blocks=4)
+    _fill(store, 0, 10)
+    n, errors, done = 3000, [], threading.Event()
+
+    def reader():
+        rng = np.random.default_rng(1)
+        while not done.is_set():
+            size = len(store)
+            # Rows near the end are in the block that is about to be sealed
+            for i in list(range(max(0, size - 10), size)) + [int(r) for r in rng.integers(0, size, 10)]:
+                try:
+                    if store.text(i) != _chunk(i):
+                        errors.append(i)
+                except Exception as e:
+                    errors.append(f"{i}: {type(e).__name__}: {e}")
+
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for t in threads:
+        t.start()
+    try:
+        _fill(store, 10, n, batch=3)
+    finally:
+        done.set()
+        for t in threads:
+            t.join()
+    assert errors == []
+    for i in range(n):
+        _check_row(store, i)
@@ -0,0 +1,91 @@
+# Request-shape and prompt-caching tests against the local fake Bedrock endpoint (fake_bedrock.py).
+
+import threading
+
+import pytest
+
+import fake_bedrock
+import server
+
+CACHING_MODEL = "us.anthropic.claude-sonnet-4-20250514-v1:0"   # 1024-token minimum
+HAIKU_45 = "us.anthropic.claude-haiku-4-5-20251001-v1:0"       # 4096-token minimum
+PLAIN_MODEL = "amazon.titan-text-express-v1"
+
+LONG_PASSAGES = ["invoice total from Acme Corp was 1,234 USD. " * 60, "deploy failed on pod web-1. " * 60]
+SHORT_PASSAGES = ["The invoice total was 12 USD."]
+
+
+def _breakpoints(body):
+    system = body["system"] if isinstance(body["system"], list) else []
+    blocks = system + [b for m in body["messages"] for b in m["content"]]
+    return [b for b in blocks if "cache_control" in b]
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    httpd = fake_bedrock.make_server(0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    fake_bedrock.REQUESTS.clear()
+    fake_bedrock.SEEN_PREFIXES.clear()
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    monkeypatch.setattr(server, "BEDROCK_ENDPOINT_URL", f"http://127.0.0.1:{httpd.server_address[1]}")
+    yield fake_bedrock
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_stable_blocks_come_first_and_question_last():
+    history = [{"question": "What happened on Monday?", "answer": "A deploy failed."}]
+    body = server.build_strict_answer_body("And the invoice?", LONG_PASSAGES, model_id=CACHING_MODEL,
+                                           history=history)
+    assert body["anthropic_version"] == "bedrock-2023-05-31"
+    assert body["messages"][0]["content"][0]["text"] == "What happened on Monday?"
+    last = body["messages"][-1]["content"]
+    assert last[0]["text"].startswith("Context")
+    assert last[-1]["text"] == "Question:\nAnd the invoice?"
+    assert "cache_control" not in last[-1]
+    assert fake_bedrock.validate(body) is None
+
+
+def test_context_breakpoint_only_above_model_minimum():
+    body = server.build_strict_answer_body("What was the total?", LONG_PASSAGES, model_id=CACHING_MODEL)
+    assert len(_breakpoints(body)) == 1 # System prefix alone is too short; system + context is not
+    assert "cache_control" in body["messages"][-1]["content"][0]
+
+    body = server.build_strict_answer_body("What was the total?", SHORT_PASSAGES, model_id=CACHING_MODEL)
+    assert _breakpoints(body) == []
+
+    # The whole prompt is capped by MAX_CONTEXT_CHARS, which stays below Haiku 4.5's 4096 tokens
+    body = server.build_strict_answer_body("What was the total?", LONG_PASSAGES * 5, model_id=HAIKU_45)
+    assert _breakpoints(body) == []
+
+
+def test_plain_path_for_models_without_caching():
+    body = server.build_strict_answer_body("What was the total?", LONG_PASSAGES, model_id=PLAIN_MODEL)
+    assert isinstance(body["system"], str)
+    assert _breakpoints(body) == []
+
+
+def test_fake_ignores_breakpoints_below_minimum():
+    body = server.build_strict_answer_body("q", SHORT_PASSAGES, model_id=CACHING_MODEL)
+    body["system"] = [{"type": "text", "text": body["system"], "cache_control": {"type": "ephemeral"}}]
+    fake_bedrock.SEEN_PREFIXES.clear()
+    usage = fake_bedrock.usage_for(body, CACHING_MODEL)
+    assert usage["cache_creation_input_tokens"] == 0
+    assert usage["cache_read_input_tokens"] == 0
+
+
+def test_repeated_context_is_read_from_cache(fake):
+    before = dict(server.PROMPT_CACHE_STATS)
+    server.call_bedrock_strict_answer("What was the total?", LONG_PASSAGES, model_id=CACHING_MODEL)
+    server.call_bedrock_strict_answer("Who sent it?", LONG_PASSAGES, model_id=CACHING_MODEL)
+
+    assert len(fake.REQUESTS) == 2
+    assert all(fake.validate(r["body"]) is None for r in fake.REQUESTS)
+    stats = server.PROMPT_CACHE_STATS
+    assert stats["requests"] - before["requests"] == 2
+    assert stats["cache_creation_input_tokens"] > before["cache_creation_input_tokens"]
+    assert stats["cache_read_input_tokens"] > before["cache_read_input_tokens"]
+    assert stats["cached_requests"] - before["cached_requests"] == 1
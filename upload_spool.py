@@ -0,0 +1,109 @@
+# Durable on-disk spool for work that must survive network errors and restarts.
+# Layout: <root>/pending/<id>.bin (payload) + <id>.json (entry). The .json is written last
+# via an atomic rename, so an entry only exists once its payload is fully on disk.
+# Entries that exhaust their retries are moved to <root>/failed/ for inspection.
+
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Any, Dict, List
+
+
+class UploadSpool:
+    def __init__(self, root: str, max_attempts: int = 8, retry_base: float = 2.0, retry_max: float = 300.0):
+        self.root = root
+        self.pending_dir = os.path.join(root, "pending")
+        self.failed_dir = os.path.join(root, "failed")
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._lock = threading.Lock()
+        os.makedirs(self.pending_dir, exist_ok=True)
+        os.makedirs(self.failed_dir, exist_ok=True)
+
+    def _paths(self, entry_id: str, folder: str | None = None):
+        folder = folder or self.pending_dir
+        return os.path.join(folder, f"{entry_id}.bin"), os.path.join(folder, f"{entry_id}.json")
+
+    def _write_entry(self, entry: Dict[str, Any]):
+        _, meta_path = self._paths(entry["id"])
+        tmp = meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, meta_path)
+
+    def enqueue(self, kind: str, payload: bytes, **meta) -> str:
+        """Persist a payload plus metadata; returns the entry id (sortable by creation time)."""
+        entry_id = f"{time.time_ns()}_{uuid.uuid4().hex[:8]}"
+        data_path, _ = self._paths(entry_id)
+        with open(data_path, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self._write_entry({
+            "id": entry_id,
+            "kind": kind,
+            "attempts": 0,
+            "next_attempt": 0.0,
+            "created": time.time(),
+            "last_error": None,
+            **meta,
+        })
+        return entry_id
+
+    def ready(self, now: float | None = None) -> List[Dict[str, Any]]:
+        """Entries due for (re)processing, oldest first."""
+        now = time.time() if now is None else now
+        entries = []
+        for name in sorted(os.listdir(self.pending_dir)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.pending_dir, name), "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[WARN] Skipping unreadable spool entry {name}: {e}")
+                continue
+            if entry.get("next_attempt", 0) <= now:
+                entries.append(entry)
+        return entries
+
+    def payload_path(self, entry: Dict[str, Any]) -> str:
+        return self._paths(entry["id"])[0]
+
+    def read_payload(self, entry: Dict[str, Any]) -> bytes:
+        with open(self.payload_path(entry), "rb") as f:
+            return f.read()
+
+    def complete(self, entry: Dict[str, Any]):
+        with self._lock:
+            for path in self._paths(entry["id"]):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def retry(self, entry: Dict[str, Any], error: str):
+        """Schedule another attempt with jittered exponential backoff, or park it in failed/."""
+        with self._lock:
+            entry["attempts"] = entry.get("attempts", 0) + 1
+            entry["last_error"] = error
+            if entry["attempts"] >= self.max_attempts:
+                for src, dst in zip(self._paths(entry["id"]), self._paths(entry["id"], self.failed_dir)):
+                    if os.path.exists(src):
+                        os.replace(src, dst)
+                with open(self._paths(entry["id"], self.failed_dir)[1], "w", encoding="utf-8") as f:
+                    json.dump(entry, f)
+                return False
+            delay = random.uniform(0.5, 1.0) * min(self.retry_max, self.retry_base * (2 ** entry["attempts"]))
+            entry["next_attempt"] = time.time() + delay
+            self._write_entry(entry)
+            return True
+
+    def depth(self) -> int:
+        return sum(1 for name in os.listdir(self.pending_dir) if name.endswith(".json"))